@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Activity Feed
+Append-only log of dashboard events (codes, devices, packages, sessions) in
+activity_events. Events are buffered and appended in batches like heartbeats
+and downloads, and the feed is read newest first with a keyset cursor over
+the (created_at DESC, id DESC) index, so every page is one indexed range read.
+With several worker processes, follow() tails the table so each worker can
+relay events recorded by the others to its own dashboard streams.
+"""
+
+import base64
+import json
+import os
+import threading
+from datetime import datetime
+
+from heartbeats import utc_timestamp
+
+# One feed page, newest first. {where} is built from the filters below.
+ACTIVITY_PAGE_SQL = '''
+    SELECT id, type, subject, data, created_at
+    FROM activity_events
+    {where}
+    ORDER BY created_at DESC, id DESC
+    LIMIT ?
+'''
+ACTIVITY_CURSOR_FILTER = '(created_at, id) < (?, ?)'
+
+
+def activity_types_filter(types):
+    return f"type IN ({','.join('?' * len(types))})"
+
+
+def encode_activity_cursor(created_at, event_id):
+    """Opaque keyset cursor for the (created_at, id) activity ordering"""
+    raw = json.dumps([created_at, event_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_activity_cursor(cursor):
+    created_at, event_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return str(created_at), int(event_id)
+
+
+def describe(event_type, data):
+    """Title and description shown in the dashboard feed"""
+    who = (data.get('customer_name') or data.get('device_name') or data.get('device_id')
+           or data.get('support_code') or '')
+    titles = {
+        'code_created': f'Support code generated for {who}',
+        'codes_created': f"{data.get('count')} support codes generated",
+        'code_expired': f"Support code {data.get('support_code')} expired",
+        'codes_expired': f"{data.get('count')} support codes expired",
+        'device_heartbeat': f'Device online: {who}',
+        'device_registered': f"Device registered: {data.get('device_name')}",
+        'package_ready': f"Installer ready for code {data.get('support_code')}",
+        'package_failed': f"Installer build failed for code {data.get('support_code')}",
+        'session_started': f'Session started: {who}',
+        'session_ended': f'Session ended: {who}'
+    }
+    descriptions = {
+        'code_created': 'New support code created for customer assistance',
+        'device_registered': f"Customer {data.get('customer_name')} installed ConnectAssist"
+    }
+    description = (descriptions.get(event_type) or data.get('error')
+                   or data.get('connection_type') or '')
+    return titles.get(event_type, event_type), description
+
+
+class ActivityLog:
+    def __init__(self, database, flush_interval=0.5):
+        self.db = database
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._follower = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='activity-log', daemon=True)
+            self._thread.start()
+
+    def follow(self, callback, interval=1.0):
+        """Call callback(event_type, data) for events other processes append"""
+        if self._follower is None:
+            self._follower = threading.Thread(target=self._follow, args=(callback, interval),
+                                              name='activity-follow', daemon=True)
+            self._follower.start()
+
+    def stop(self):
+        """Stop the background threads and append anything still buffered"""
+        self._stop.set()
+        for thread in (self._thread, self._follower):
+            if thread is not None:
+                thread.join()
+        self._thread = self._follower = None
+        self.flush()
+
+    def record(self, event_type, data=None):
+        """Queue an event for the feed"""
+        data = data or {}
+        subject = data.get('support_code') or data.get('device_id')
+        event = (event_type, subject, json.dumps(data, default=str),
+                 utc_timestamp(datetime.utcnow()), os.getpid())
+        with self._lock:
+            self._pending.append(event)
+
+    def flush(self):
+        """Append every buffered event in one transaction"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+
+        try:
+            with self.db.transaction() as cursor:
+                cursor.executemany('''
+                    INSERT INTO activity_events (type, subject, data, created_at, origin)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', batch)
+        except Exception:
+            with self._lock:
+                self._pending[:0] = batch
+            raise
+        return len(batch)
+
+    def page(self, limit=10, cursor=None, types=None):
+        """Return (events, next_cursor), newest first"""
+        clauses = []
+        params = []
+        if cursor:
+            clauses.append(ACTIVITY_CURSOR_FILTER)
+            params.extend(decode_activity_cursor(cursor))
+        if types:
+            clauses.append(activity_types_filter(types))
+            params.extend(types)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+
+        rows = self.db.fetchall(ACTIVITY_PAGE_SQL.format(where=where), params + [limit + 1])
+
+        events = []
+        for event_id, event_type, subject, data, created_at in rows[:limit]:
+            data = json.loads(data) if data else {}
+            title, description = describe(event_type, data)
+            events.append({
+                'id': event_id,
+                'type': event_type,
+                'subject': subject,
+                'title': title,
+                'description': description,
+                'data': data,
+                'timestamp': created_at
+            })
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_activity_cursor(last[4], last[0])
+        return events, next_cursor
+
+    def _follow(self, callback, interval):
+        try:
+            last_id = self.db.fetchone('SELECT IFNULL(MAX(id), 0) FROM activity_events')[0]
+            pid = os.getpid()
+            while not self._stop.wait(interval):
+                try:
+                    rows = self.db.fetchall('''
+                        SELECT id, type, data, origin FROM activity_events
+                        WHERE id > ?
+                        ORDER BY id
+                        LIMIT 500
+                    ''', (last_id,))
+                    for event_id, event_type, data, origin in rows:
+                        last_id = event_id
+                        if origin != pid:
+                            callback(event_type, json.loads(data) if data else {})
+                except Exception as e:
+                    print(f"Activity follow failed: {e}")
+        finally:
+            self.db.release()
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Activity log flush failed: {e}")
+        finally:
+            self.db.release()
@@ -6,20 +6,44 @@ Handles admin dashboard operations, support code generation, and client creation
 
 import os
 import sys
+import atexit
+import signal
 import json
+import base64
 import sqlite3
-import secrets
-import string
 import subprocess
-import tempfile
-import zipfile
 from datetime import datetime, timedelta
 from pathlib import Path
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 
 # Add builder directory to path for client generation
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'builder'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import Database
+from package_queue import PackageBuildQueue
+from package_templates import PackageTemplateCache
+from package_stream import ZipStream, parse_byte_range
+from installer_files import (InstallerFiles, SendfileBody, package_digest, file_validators, http_date,
+                             etag_matches, if_range_matches, accel_redirect_uri)
+from artifact_fetch import ArtifactFetcher, ArtifactFetchError, load_artifact_config
+from dashboard_stats import DashboardStats, parse_timestamp
+from migrations import migrate
+from event_bus import EventBus
+from heartbeats import HeartbeatBuffer
+from code_allocator import CodeAllocator
+from warm_pool import WarmPool
+from sweeper import ExpirySweeper
+from code_cache import CodeCache
+from download_tracker import DownloadTracker
+from activity import ActivityLog
+import search as search_index
+from queries import (RETIRE_EXPIRED_CODE_SQL, LIVE_CODE_SQL, LATEST_CODE_PACKAGE_SQL,
+                     DEVICE_CONNECTION_SQL, DEVICE_PAGE_SQL, DEVICE_STATUS_FILTERS,
+                     DEVICE_CUSTOMER_FILTER, DEVICE_OS_FILTER, DEVICE_SINCE_FILTER,
+                     DEVICE_CURSOR_FILTER, DEVICE_FIRST_CURSOR, where_clause)
+from session_rollups import SessionRollups, GRANULARITIES, DIMENSIONS
 
 app = Flask(__name__)
 CORS(app)
@@ -28,209 +52,277 @@ CORS(app)
 DATABASE_PATH = '/opt/connectassist/data/connectassist.db'
 BUILDER_PATH = '/opt/connectassist/builder'
 DOWNLOADS_PATH = '/opt/connectassist/www/downloads'
+PACKAGE_BUILD_WORKERS = 2
+PACKAGE_CACHE_PATH = '/opt/connectassist/data/package-cache'
+INSTALLER_FILES_PATH = '/opt/connectassist/data/installers'
+STATS_CACHE_TTL = 2
+STATS_RESYNC_INTERVAL = 60
+HEARTBEAT_FLUSH_INTERVAL = 1
+BULK_MAX_CODES = 1000
+WARM_POOL_SIZE = 50
+WARM_POOL_LOW_WATER = 20
+WARM_POOL_TTL_HOURS = 24
+SWEEP_INTERVAL = 300
+SWEEP_ARCHIVE_PATH = None
+INSTALLER_CACHE_SIZE = 4096
+INSTALLER_CACHE_TTL = 30
+DOWNLOAD_FLUSH_INTERVAL = 0.25
+DOWNLOAD_FLUSH_BATCH = 500
+SESSION_ROLLUP_INTERVAL = 60
+ACTIVITY_FLUSH_INTERVAL = 0.5
+ACTIVITY_PAGE_LIMIT = 100
+SEARCH_MAX_RESULTS = 100
+# Open event streams and long polls per process; each holds a request thread
+# under the WSGI servers, so keep this well below --threads
+EVENT_SUBSCRIBER_LIMIT = 8
+EVENT_RETRY_SECONDS = 30
+
+# Shared connection pool for routes and AdminAPI methods
+db = Database(DATABASE_PATH)
+
+# Prebuilt base archives for client packages
+package_templates = PackageTemplateCache(PACKAGE_CACHE_PATH)
+
+# Per-code installer ZIPs on disk, named by content hash, for sendfile and X-Accel-Redirect
+installer_files = InstallerFiles(INSTALLER_FILES_PATH)
+
+# Checksum-verified, single-flight cache of downloaded build artifacts
+artifacts, artifact_mirror = load_artifact_config(os.path.join(BUILDER_PATH, 'builder-config.json'))
+artifact_fetcher = ArtifactFetcher(Path(BUILDER_PATH) / 'downloads', artifacts, artifact_mirror)
+
+# Incrementally maintained counters for GET /api/stats
+dashboard_stats = DashboardStats(db, ttl=STATS_CACHE_TTL, resync_interval=STATS_RESYNC_INTERVAL)
+
+# Push channel for dashboards (GET /api/events)
+event_bus = EventBus(max_subscribers=EVENT_SUBSCRIBER_LIMIT)
+
+# Append-only activity feed (GET /api/activity)
+activity_log = ActivityLog(db, flush_interval=ACTIVITY_FLUSH_INTERVAL)
+
+def notify(event_type, data):
+    """Record a dashboard event, then push it followed by the updated counters"""
+    activity_log.record(event_type, data)
+    event_bus.publish(event_type, data)
+    event_bus.publish('stats', dashboard_stats.get())
+
+def record_flushed_heartbeats(devices):
+    """Feed each flushed batch of heartbeats into the dashboard counters"""
+    for device in devices:
+        dashboard_stats.device_seen(device['id'], device.get('customer_name'), device['last_seen'])
+
+# Buffered device heartbeats, flushed to SQLite in batches
+heartbeats = HeartbeatBuffer(db, flush_interval=HEARTBEAT_FLUSH_INTERVAL,
+                             on_flush=record_flushed_heartbeats)
+
+# Validated support codes for POST /api/customer/installer
+installer_cache = CodeCache(maxsize=INSTALLER_CACHE_SIZE, ttl=INSTALLER_CACHE_TTL)
+
+# Write-behind queue for package downloads and download analytics
+download_tracker = DownloadTracker(db, flush_interval=DOWNLOAD_FLUSH_INTERVAL,
+                                   max_batch=DOWNLOAD_FLUSH_BATCH)
+
+def client_address():
+    """Client IP, taking the first hop recorded by the reverse proxy"""
+    forwarded = request.headers.get('X-Forwarded-For')
+    return forwarded.split(',')[0].strip() if forwarded else request.remote_addr
+
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    """Return the request thread's connection to the pool"""
+    db.release()
 
 class AdminAPI:
-    def __init__(self):
-        self.init_database()
+    def __init__(self, database=None):
+        self.db = database or db
+        # Loaded from the database by start_services(), once the schema exists
+        self.code_allocator = CodeAllocator()
     
     def init_database(self):
-        """Initialize the database with admin-specific tables"""
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        # Create admin tables
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS admin_sessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_token TEXT UNIQUE NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                expires_at TIMESTAMP NOT NULL,
-                technician_name TEXT,
-                ip_address TEXT
-            )
-        ''')
-        
-        # Create client packages table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS client_packages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                support_code TEXT NOT NULL,
-                package_path TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                downloaded_at TIMESTAMP,
-                customer_name TEXT,
-                customer_email TEXT,
-                customer_phone TEXT,
-                session_notes TEXT
-            )
-        ''')
-        
-        # Create connection logs table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS connection_logs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                device_id TEXT NOT NULL,
-                technician_id TEXT,
-                connection_type TEXT,
-                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                ended_at TIMESTAMP,
-                duration INTEGER,
-                status TEXT DEFAULT 'active'
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        """Create or upgrade the database schema"""
+        migrate(self.db)
     
-    def generate_support_code(self):
-        """Generate a unique 6-digit support code"""
+    def generate_support_code(self, expires_at):
+        """Reserve a unique 6-digit support code until expires_at"""
+        return self.code_allocator.allocate(expires_at)
+    
+    def insert_support_code(self, cursor, customer_data, expires_at, status='active'):
+        """Reserve a code and insert its row inside the caller's transaction"""
         while True:
-            code = ''.join(secrets.choice(string.digits) for _ in range(6))
-            
-            # Check if code already exists and is still valid
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT id FROM support_codes 
-                WHERE code = ? AND expires_at > datetime('now')
-            ''', (code,))
-            
-            if not cursor.fetchone():
-                conn.close()
+            code = self.generate_support_code(expires_at)
+            try:
+                # Free the code if an old row for it has passed its expiry
+                cursor.execute(RETIRE_EXPIRED_CODE_SQL, (code,))
+                
+                # The unique index on live codes makes this the reservation
+                cursor.execute('''
+                    INSERT INTO support_codes (code, expires_at, customer_name, customer_email, 
+                                             customer_phone, session_notes, status)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    code,
+                    expires_at.isoformat(),
+                    customer_data.get('customer_name'),
+                    customer_data.get('customer_email'),
+                    customer_data.get('customer_phone'),
+                    customer_data.get('session_notes'),
+                    status
+                ))
                 return code
-            
-            conn.close()
+            except sqlite3.IntegrityError:
+                # Another worker holds this code; it stays reserved here until
+                # it expires, so just take a different one
+                continue
     
     def create_support_code(self, customer_data):
         """Create a new support code with customer information"""
-        code = self.generate_support_code()
         expires_at = datetime.now() + timedelta(hours=24)
         
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+        # A pooled code already has its package prepared
+        code = warm_pool.claim(customer_data, expires_at)
+        package_ready = code is not None
+        if not package_ready:
+            with self.db.transaction() as cursor:
+                code = self.insert_support_code(cursor, customer_data, expires_at)
+        
+        dashboard_stats.code_created(code, expires_at)
+        notify('code_created', {
+            'support_code': code,
+            'customer_name': customer_data.get('customer_name'),
+            'expires_at': expires_at.isoformat()
+        })
+        
+        return {
+            'success': True,
+            'support_code': code,
+            'expires_at': expires_at.isoformat(),
+            'customer_data': customer_data,
+            'package_ready': package_ready
+        }
+    
+    def create_support_codes(self, customers):
+        """Create support codes for many customers in one transaction"""
+        expires_at = datetime.now() + timedelta(hours=24)
+        
+        with self.db.transaction() as cursor:
+            codes = [self.insert_support_code(cursor, customer_data, expires_at)
+                     for customer_data in customers]
+        
+        for code in codes:
+            dashboard_stats.code_created(code, expires_at)
+        notify('codes_created', {
+            'count': len(codes),
+            'support_codes': codes,
+            'expires_at': expires_at.isoformat()
+        })
         
+        return [{
+            'support_code': code,
+            'expires_at': expires_at.isoformat(),
+            'customer_data': customer_data
+        } for code, customer_data in zip(codes, customers)]
+    
+    def create_client_config(self, support_code, customer_data):
+        """Create the client configuration for the support code"""
+        return {
+            "server": "connectassist.live",
+            "relay_server": "connectassist.live:21117",
+            "signal_server": "connectassist.live:21115",
+            "api_server": "https://connectassist.live",
+            "permanent_password": f"CA{support_code}!",
+            "auto_connect": True,
+            "unattended_access": True,
+            "install_service": True,
+            "auto_start": True,
+            "start_minimized": True,
+            "service_name": "ConnectAssist Remote Support",
+            "support_code": support_code,
+            "customer_info": customer_data
+        }
+    
+    def get_static_package_files(self):
+        """List the (source, arcname) files shared by every client package"""
+        # Download (or verify) the RustDesk binary; raises if unavailable
+        rustdesk_binary = artifact_fetcher.fetch('rustdesk-windows')
+        
+        static_files = [(rustdesk_binary, 'connectassist-windows.exe')]
+        
+        # Installation scripts
+        scripts = ['install-service.ps1', 'install-connectassist.bat']
+        for script in scripts:
+            script_path = Path(BUILDER_PATH) / script
+            if script_path.exists():
+                static_files.append((script_path, script))
+        
+        return static_files
+    
+    def get_generated_package_files(self, support_code, customer_data):
+        """Create the per-code files as {arcname: text}"""
+        config = self.create_client_config(support_code, customer_data)
+        return {
+            'connectassist-config.json': json.dumps(config, indent=2),
+            'INSTALLATION-INSTRUCTIONS.txt': self.create_installation_instructions(support_code, customer_data),
+            'setup-connectassist.bat': self.create_setup_script(support_code)
+        }
+    
+    def get_package_name(self, support_code, customer_data):
+        """File name offered to the customer for the package download"""
+        return f"ConnectAssist-{support_code}-{(customer_data.get('customer_name') or 'Customer').replace(' ', '')}.zip"
+    
+    def create_package_stream(self, support_code, customer_data, timestamp):
+        """Describe the client package ZIP for streaming.
+        
+        timestamp (the code's expires_at) dates the generated entries, so
+        every download of a code is byte-identical and can be resumed.
+        """
+        base_path = package_templates.get_base(self.get_static_package_files())
+        date_time = datetime.fromisoformat(str(timestamp)).timetuple()[:6]
+        return ZipStream(
+            base_path,
+            self.get_generated_package_files(support_code, customer_data),
+            date_time
+        )
+    
+    def prepare_package_base(self):
+        """Make sure the shared base archive (and the RustDesk binary behind it) exists"""
+        return package_templates.get_base(self.get_static_package_files())
+    
+    def record_client_package(self, cursor, support_code, customer_data, base_path=None):
+        """Record the client package for a code inside the caller's transaction"""
+        if base_path is None:
+            base_path = self.prepare_package_base()
         cursor.execute('''
-            INSERT INTO support_codes (code, expires_at, customer_name, customer_email, 
-                                     customer_phone, session_notes, status)
-            VALUES (?, ?, ?, ?, ?, ?, 'active')
+            INSERT INTO client_packages (support_code, package_path, customer_name, 
+                                       customer_email, customer_phone, session_notes)
+            VALUES (?, ?, ?, ?, ?, ?)
         ''', (
-            code,
-            expires_at.isoformat(),
+            support_code,
+            str(base_path),
             customer_data.get('customer_name'),
             customer_data.get('customer_email'),
             customer_data.get('customer_phone'),
             customer_data.get('session_notes')
         ))
-        
-        conn.commit()
-        conn.close()
-        
         return {
             'success': True,
-            'support_code': code,
-            'expires_at': expires_at.isoformat(),
-            'customer_data': customer_data
+            'package_path': str(base_path),
+            'package_name': self.get_package_name(support_code, customer_data),
+            'download_url': f'/api/installer/{support_code}/download'
         }
     
     def create_client_package(self, support_code, customer_data):
-        """Create a custom client package for the support code"""
+        """Prepare the client package for the support code.
+        
+        Packages are streamed on download, so this only makes sure the base
+        archive (and the RustDesk binary behind it) is ready and records the
+        package; nothing is written per support code.
+        """
         try:
-            # Create temporary directory for package creation
-            with tempfile.TemporaryDirectory() as temp_dir:
-                temp_path = Path(temp_dir)
-                
-                # Copy RustDesk binary
-                rustdesk_binary = Path(BUILDER_PATH) / 'downloads' / 'rustdesk-windows.exe'
-                if not rustdesk_binary.exists():
-                    # Download RustDesk binary if not exists
-                    self.download_rustdesk_binary()
-                
-                client_exe = temp_path / 'connectassist-windows.exe'
-                if rustdesk_binary.exists():
-                    import shutil
-                    shutil.copy2(rustdesk_binary, client_exe)
-                else:
-                    raise Exception("RustDesk binary not available")
-                
-                # Copy installation scripts
-                scripts = ['install-service.ps1', 'install-connectassist.bat']
-                for script in scripts:
-                    script_path = Path(BUILDER_PATH) / script
-                    if script_path.exists():
-                        import shutil
-                        shutil.copy2(script_path, temp_path / script)
-                
-                # Create client configuration
-                config = {
-                    "server": "connectassist.live",
-                    "relay_server": "connectassist.live:21117",
-                    "signal_server": "connectassist.live:21115",
-                    "api_server": "https://connectassist.live",
-                    "permanent_password": f"CA{support_code}!",
-                    "auto_connect": True,
-                    "unattended_access": True,
-                    "install_service": True,
-                    "auto_start": True,
-                    "start_minimized": True,
-                    "service_name": "ConnectAssist Remote Support",
-                    "support_code": support_code,
-                    "customer_info": customer_data
-                }
-                
-                config_file = temp_path / 'connectassist-config.json'
-                with open(config_file, 'w') as f:
-                    json.dump(config, f, indent=2)
-                
-                # Create installation instructions
-                instructions = self.create_installation_instructions(support_code, customer_data)
-                instructions_file = temp_path / 'INSTALLATION-INSTRUCTIONS.txt'
-                with open(instructions_file, 'w', encoding='utf-8') as f:
-                    f.write(instructions)
-                
-                # Create setup launcher
-                setup_script = self.create_setup_script(support_code)
-                setup_file = temp_path / 'setup-connectassist.bat'
-                with open(setup_file, 'w', encoding='utf-8') as f:
-                    f.write(setup_script)
-                
-                # Create ZIP package
-                package_name = f"ConnectAssist-{support_code}-{customer_data.get('customer_name', 'Customer').replace(' ', '')}.zip"
-                package_path = Path(DOWNLOADS_PATH) / package_name
-                
-                # Ensure downloads directory exists
-                package_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                with zipfile.ZipFile(package_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for file_path in temp_path.rglob('*'):
-                        if file_path.is_file():
-                            arcname = file_path.relative_to(temp_path)
-                            zipf.write(file_path, arcname)
-                
-                # Record package in database
-                conn = sqlite3.connect(DATABASE_PATH)
-                cursor = conn.cursor()
-                cursor.execute('''
-                    INSERT INTO client_packages (support_code, package_path, customer_name, 
-                                               customer_email, customer_phone, session_notes)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    support_code,
-                    str(package_path),
-                    customer_data.get('customer_name'),
-                    customer_data.get('customer_email'),
-                    customer_data.get('customer_phone'),
-                    customer_data.get('session_notes')
-                ))
-                conn.commit()
-                conn.close()
-                
-                return {
-                    'success': True,
-                    'package_path': str(package_path),
-                    'package_name': package_name,
-                    'download_url': f'/downloads/{package_name}'
-                }
-                
+            base_path = self.prepare_package_base()
+            
+            # Record package in database
+            with self.db.transaction() as cursor:
+                return self.record_client_package(cursor, support_code, customer_data, base_path)
+            
         except Exception as e:
             return {
                 'success': False,
@@ -239,16 +331,8 @@ class AdminAPI:
     
     def download_rustdesk_binary(self):
         """Download RustDesk binary if not exists"""
-        import urllib.request
-        
-        download_url = "https://github.com/rustdesk/rustdesk/releases/download/1.2.3/rustdesk-1.2.3-x86_64.exe"
-        binary_path = Path(BUILDER_PATH) / 'downloads' / 'rustdesk-windows.exe'
-        
-        # Create downloads directory
-        binary_path.parent.mkdir(parents=True, exist_ok=True)
-        
         try:
-            urllib.request.urlretrieve(download_url, binary_path)
+            artifact_fetcher.fetch('rustdesk-windows')
             return True
         except Exception as e:
             print(f"Failed to download RustDesk binary: {e}")
@@ -352,48 +436,132 @@ call install-connectassist.bat
 
 # Initialize API
 admin_api = AdminAPI()
+package_queue = PackageBuildQueue(db, admin_api.create_client_package,
+                                  max_workers=PACKAGE_BUILD_WORKERS,
+                                  on_complete=lambda job: notify('package_' + job['status'], job))
+warm_pool = WarmPool(db, admin_api, size=WARM_POOL_SIZE, low_water=WARM_POOL_LOW_WATER,
+                     ttl=timedelta(hours=WARM_POOL_TTL_HOURS))
+
+def expire_codes_locally(codes):
+    """Drop expired codes from this worker's cache, allocator and counters"""
+    for code in codes:
+        installer_cache.invalidate(code)
+        admin_api.code_allocator.release(code)
+        dashboard_stats.code_expired(code)
+
+def record_expired_codes(codes):
+    """Publish codes the sweeper expired, so dashboards update without polling"""
+    expire_codes_locally(codes)
+    notify('codes_expired', {'count': len(codes), 'support_codes': codes})
+
+def record_sweep(report):
+    """Account for sessions the sweeper timed out and publish its report"""
+    if report['sessions_timed_out']:
+        dashboard_stats.session_ended(report['sessions_timed_out'])
+    event_bus.publish('sweep', report)
+
+# Expires codes and sessions, and garbage-collects old packages, jobs and logs
+# Only names the API writes are collected: legacy per-code ZIPs in the
+# downloads directory and base archives in the package cache
+sweeper = ExpirySweeper(db, [(DOWNLOADS_PATH, 'ConnectAssist-*.zip'), (PACKAGE_CACHE_PATH, 'base-*.zip')],
+                        archive_dir=SWEEP_ARCHIVE_PATH, interval=SWEEP_INTERVAL,
+                        caches=[installer_files],
+                        keep_files=lambda: [admin_api.prepare_package_base()],
+                        on_expire=record_expired_codes, on_sweep=record_sweep)
+# Hourly and daily session statistics for GET /api/reports/sessions
+session_rollups = SessionRollups(db, interval=SESSION_ROLLUP_INTERVAL)
+
+# Lifecycle
+# Startup is split so a multi-process server can create the schema once in
+# its master and start the per-process services in each worker after fork.
+# Services that must run once per deployment (warm pool refill, sweeper,
+# rollups) are "singletons" and start in one worker only.
+_services = {'started': False, 'singletons': False}
+
+def init_schema():
+    """Create or upgrade the schema, then close the connections used for it"""
+    admin_api.init_database()
+    db.close_all()
+
+def relay_activity(event_type, data):
+    """Apply an event another worker recorded to this worker's state and streams"""
+    if event_type == 'code_created':
+        expires_at = parse_timestamp(data['expires_at'])
+        admin_api.code_allocator.extend(data['support_code'], expires_at)
+        dashboard_stats.code_created(data['support_code'], expires_at)
+    elif event_type == 'codes_created':
+        expires_at = parse_timestamp(data['expires_at'])
+        for code in data.get('support_codes', ()):
+            admin_api.code_allocator.extend(code, expires_at)
+            dashboard_stats.code_created(code, expires_at)
+    elif event_type == 'code_expired':
+        expire_codes_locally([data['support_code']])
+    elif event_type == 'codes_expired':
+        expire_codes_locally(data['support_codes'])
+    elif event_type == 'device_heartbeat':
+        dashboard_stats.device_seen(data['id'], data.get('customer_name'), data.get('last_seen'))
+    elif event_type == 'session_started':
+        dashboard_stats.session_started()
+    elif event_type == 'session_ended':
+        dashboard_stats.session_ended()
+    event_bus.publish(event_type, data)
+    event_bus.publish('stats', dashboard_stats.get())
+
+def start_services(singletons=True, follow_activity=False):
+    """Load in-memory state and start this process's background threads.
+
+    singletons: also run the warm pool, sweeper and session rollups
+    follow_activity: relay events recorded by other processes to this one
+    """
+    if _services['started']:
+        return
+    _services['started'] = True
+    admin_api.code_allocator.load(db)
+    heartbeats.load_online()
+    heartbeats.start()
+    download_tracker.start()
+    activity_log.start()
+    if follow_activity:
+        activity_log.follow(relay_activity)
+    if singletons:
+        _services['singletons'] = True
+        warm_pool.start()
+        sweeper.start()
+        session_rollups.start()
+    db.release()
+
+def stop_services():
+    """Stop background work, finish queued package builds and flush every buffer"""
+    if not _services['started']:
+        return
+    _services['started'] = False
+    # Ends open event streams so request threads can finish
+    event_bus.close()
+    if _services['singletons']:
+        warm_pool.stop()
+        sweeper.stop()
+        session_rollups.stop()
+    package_queue.shutdown(wait=True)
+    heartbeats.stop()
+    download_tracker.stop()
+    activity_log.stop()
+    db.close_all()
+
+def create_app(init_db=True, singletons=True, follow_activity=False):
+    """App factory for WSGI servers; returns the Flask app with services running"""
+    # Every installer needs the pinned RustDesk binary; refuse to start without it
+    artifact_fetcher.check_pins()
+    if init_db:
+        init_schema()
+    start_services(singletons=singletons, follow_activity=follow_activity)
+    return app
 
 # API Routes
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Get dashboard statistics"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        # Get online devices count
-        cursor.execute('''
-            SELECT COUNT(*) FROM devices 
-            WHERE last_seen > datetime('now', '-5 minutes')
-        ''')
-        online_devices = cursor.fetchone()[0]
-        
-        # Get total customers
-        cursor.execute('SELECT COUNT(DISTINCT customer_name) FROM devices WHERE customer_name IS NOT NULL')
-        total_customers = cursor.fetchone()[0]
-        
-        # Get active support codes
-        cursor.execute('''
-            SELECT COUNT(*) FROM support_codes 
-            WHERE expires_at > datetime('now') AND status = 'active'
-        ''')
-        active_codes = cursor.fetchone()[0]
-        
-        # Get active sessions
-        cursor.execute('''
-            SELECT COUNT(*) FROM connection_logs 
-            WHERE status = 'active'
-        ''')
-        active_sessions = cursor.fetchone()[0]
-        
-        conn.close()
-        
-        return jsonify({
-            'online_devices': online_devices,
-            'total_customers': total_customers,
-            'active_codes': active_codes,
-            'active_sessions': active_sessions
-        })
+        return jsonify(dashboard_stats.get())
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -411,165 +579,404 @@ def create_support_code():
         # Create support code
         result = admin_api.create_support_code(customer_data)
         
-        # Create client package
-        if result['success']:
-            package_result = admin_api.create_client_package(
+        # Queue client package build unless the code came from the warm pool
+        if result.pop('package_ready'):
+            result['package_status'] = 'ready'
+            result['download_url'] = f"/api/installer/{result['support_code']}/download"
+        elif result['success']:
+            result['package_job_id'] = package_queue.submit(
                 result['support_code'], 
                 customer_data
             )
-            result.update(package_result)
+            result['package_status'] = 'queued'
         
         return jsonify(result)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/support-codes/bulk', methods=['POST'])
+def create_support_codes_bulk():
+    """Provision support codes and packages for a list of customers"""
+    try:
+        data = request.get_json(silent=True) or {}
+        customers = data.get('customers')
+        
+        if not isinstance(customers, list) or not customers:
+            return jsonify({'error': 'A non-empty customers list is required'}), 400
+        
+        if len(customers) > BULK_MAX_CODES:
+            return jsonify({'error': f'At most {BULK_MAX_CODES} customers per request'}), 400
+        
+        for index, customer_data in enumerate(customers):
+            if not isinstance(customer_data, dict) or not customer_data.get('customer_name'):
+                return jsonify({'error': f'Customer name is required (entry {index})'}), 400
+        
+        # All codes are created in one transaction
+        results = admin_api.create_support_codes(customers)
+        
+        # Package jobs are queued together and built in parallel
+        job_ids = package_queue.submit_many([
+            (result['support_code'], result['customer_data']) for result in results
+        ])
+        
+        manifest = []
+        for result, job_id in zip(results, job_ids):
+            manifest.append({
+                'support_code': result['support_code'],
+                'customer_name': result['customer_data'].get('customer_name'),
+                'expires_at': result['expires_at'],
+                'package_job_id': job_id,
+                'status_url': f'/api/packages/{job_id}',
+                'download_url': f"/api/installer/{result['support_code']}/download"
+            })
+        
+        return jsonify({
+            'success': True,
+            'count': len(manifest),
+            'codes': manifest
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/support-codes/<code>', methods=['DELETE'])
+def revoke_support_code(code):
+    """Deactivate a support code before it expires"""
+    try:
+        with db.transaction() as cursor:
+            cursor.execute('''
+                UPDATE support_codes SET status = 'expired'
+                WHERE code = ? AND status = 'active'
+            ''', (code,))
+            revoked = cursor.rowcount
+        
+        if not revoked:
+            return jsonify({'error': 'Support code not found'}), 404
+        
+        expire_codes_locally([code])
+        notify('code_expired', {'support_code': code})
+        
+        return jsonify({
+            'success': True,
+            'message': f'Support code {code} deactivated'
+        })
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/support-codes/keyspace', methods=['GET'])
+def get_code_keyspace():
+    """Get support code keyspace occupancy"""
+    try:
+        return jsonify(admin_api.code_allocator.metrics())
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/maintenance/sweep', methods=['GET'])
+def get_sweep_report():
+    """Get the report of the last expiry sweep"""
+    try:
+        return jsonify({'last_sweep': sweeper.last_report})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/maintenance/sweep', methods=['POST'])
+def run_sweep():
+    """Run an expiry sweep now and report what it reclaimed"""
+    try:
+        return jsonify({'success': True, 'report': sweeper.sweep()})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/packages/<job_id>', methods=['GET'])
+def get_package_status(job_id):
+    """Get the build status of a queued client package"""
+    try:
+        job = package_queue.get_status(job_id)
+        if not job:
+            return jsonify({'error': 'Package job not found'}), 404
+        
+        return jsonify(job)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+DEVICE_STATUSES = ('online', 'recent', 'offline')
+def encode_device_cursor(last_seen, device_id):
+    """Opaque keyset cursor for the (last_seen, id) device ordering"""
+    raw = json.dumps([last_seen or '', device_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def decode_device_cursor(cursor):
+    last_seen, device_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return last_seen, device_id
+
+@app.route('/api/events', methods=['GET'])
+def stream_events():
+    """Server-Sent Events stream of dashboard events.
+    
+    Optional ?topics=a,b limits the stream to those event types; the
+    Last-Event-ID header resumes after the last event the client saw.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('after')
+    after_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    topics = set(filter(None, request.args.get('topics', '').split(','))) or None
+    
+    stream = event_bus.stream(after_id, topics)
+    if stream is None:
+        # Too many open streams; the retry field tells EventSource when to reconnect
+        return Response(
+            f'retry: {EVENT_RETRY_SECONDS * 1000}\n\n',
+            status=503,
+            mimetype='text/event-stream',
+            headers={'Retry-After': str(EVENT_RETRY_SECONDS)}
+        )
+    
+    return Response(
+        stream,
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stop nginx from buffering the stream
+            'X-Accel-Buffering': 'no'
+        },
+        direct_passthrough=True
+    )
+
+@app.route('/api/events/poll', methods=['GET'])
+def poll_events():
+    """Long-poll fallback for clients without EventSource support"""
+    try:
+        after_id = int(request.args.get('after', event_bus.last_id))
+        timeout = min(float(request.args.get('timeout', 25)), 55)
+        topics = set(filter(None, request.args.get('topics', '').split(','))) or None
+        
+        poll = event_bus.poll(after_id, timeout, topics, dumps=app.json.dumps)
+        if poll is None:
+            response = jsonify({'error': 'Too many open event subscriptions',
+                                'retry_after': EVENT_RETRY_SECONDS})
+            response.headers['Retry-After'] = str(EVENT_RETRY_SECONDS)
+            return response, 503
+        
+        # The wait happens while the body is sent, so under the ASGI entry
+        # point a pending poll holds a coroutine rather than a thread
+        return Response(
+            poll,
+            mimetype='application/json',
+            direct_passthrough=True
+        )
+        
+    except ValueError:
+        return jsonify({'error': 'Invalid after or timeout parameter'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/devices', methods=['GET'])
 def get_devices():
-    """Get all registered devices"""
+    """Get registered devices, one keyset page at a time.
+    
+    Query parameters:
+        limit: page size (default 100, max 500)
+        cursor: next_cursor from the previous page
+        status / customer / os: server-side filters
+        since: watermark from a previous response; only devices whose
+            last_seen or status changed after it are returned
+    """
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+        try:
+            limit = min(max(int(request.args.get('limit', 100)), 1), 500)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+        params = {'now': db.fetchone("SELECT datetime('now')")[0], 'limit': limit + 1}
+        conditions = []
         
-        cursor.execute('''
-            SELECT id, customer_name, device_name, os, last_seen, created_at,
-                   CASE 
-                       WHEN last_seen > datetime('now', '-5 minutes') THEN 'online'
-                       WHEN last_seen > datetime('now', '-1 hour') THEN 'recent'
-                       ELSE 'offline'
-                   END as status
-            FROM devices
-            ORDER BY last_seen DESC
-        ''')
+        status = request.args.get('status')
+        if status and status != 'all':
+            if status not in DEVICE_STATUSES:
+                return jsonify({'error': f'Unknown status: {status}'}), 400
+            conditions.append(DEVICE_STATUS_FILTERS[status])
+        
+        if request.args.get('customer'):
+            conditions.append(DEVICE_CUSTOMER_FILTER)
+            params['customer'] = request.args['customer']
+        
+        if request.args.get('os'):
+            conditions.append(DEVICE_OS_FILTER)
+            params['os'] = request.args['os']
+        
+        since = request.args.get('since')
+        if since:
+            try:
+                datetime.fromisoformat(since)
+            except ValueError:
+                return jsonify({'error': 'Invalid since watermark'}), 400
+            conditions.append(DEVICE_SINCE_FILTER)
+            params['since'] = since
+        
+        params['cursor_seen'], params['cursor_id'] = DEVICE_FIRST_CURSOR
+        if request.args.get('cursor'):
+            try:
+                params['cursor_seen'], params['cursor_id'] = decode_device_cursor(request.args['cursor'])
+            except (ValueError, TypeError):
+                return jsonify({'error': 'Invalid cursor'}), 400
+        conditions.append(DEVICE_CURSOR_FILTER)
+        
+        rows = db.fetchall(DEVICE_PAGE_SQL.format(where=where_clause(conditions)), params)
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_device_cursor(rows[-1][4], rows[-1][0])
         
         devices = []
-        for row in cursor.fetchall():
+        for row in rows:
             devices.append({
                 'id': row[0],
                 'customer_name': row[1],
                 'device_name': row[2],
                 'os': row[3],
-                'last_seen': row[4],
+                # '' marks a device that was never seen
+                'last_seen': row[4] or None,
                 'created_at': row[5],
                 'status': row[6]
             })
         
-        conn.close()
-        return jsonify(devices)
+        return jsonify({
+            'devices': devices,
+            'next_cursor': next_cursor,
+            'watermark': params['now']
+        })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/activity', methods=['GET'])
-def get_activity():
-    """Get recent activity"""
+@app.route('/api/devices/heartbeat', methods=['POST'])
+def device_heartbeat():
+    """Register a device or record that it is still online.
+    
+    Heartbeats are buffered and written in batches, so this never waits on
+    the database.
+    """
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-        
-        # Get recent activities from multiple sources
-        activities = []
+        data = request.get_json(silent=True) or {}
+        device_id = data.get('device_id')
         
-        # Recent support codes
-        cursor.execute('''
-            SELECT 'code_generated' as type, customer_name, created_at
-            FROM support_codes
-            WHERE created_at > datetime('now', '-24 hours')
-            ORDER BY created_at DESC
-            LIMIT 5
-        ''')
-        
-        for row in cursor.fetchall():
-            activities.append({
-                'type': row[0],
-                'title': f'Support code generated for {row[1]}',
-                'description': 'New support code created for customer assistance',
-                'timestamp': row[2]
-            })
+        if not device_id:
+            return jsonify({'error': 'Device ID is required'}), 400
         
-        # Recent device registrations
-        cursor.execute('''
-            SELECT 'device_registered' as type, customer_name, device_name, created_at
-            FROM devices
-            WHERE created_at > datetime('now', '-24 hours')
-            ORDER BY created_at DESC
-            LIMIT 5
-        ''')
-        
-        for row in cursor.fetchall():
-            activities.append({
-                'type': row[0],
-                'title': f'Device registered: {row[2]}',
-                'description': f'Customer {row[1]} installed ConnectAssist',
-                'timestamp': row[3]
+        came_online = heartbeats.record(str(device_id), data)
+        if came_online:
+            notify('device_heartbeat', {
+                'id': str(device_id),
+                'customer_name': data.get('customer_name'),
+                'device_name': data.get('device_name'),
+                'os': data.get('os'),
+                'last_seen': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'),
+                'status': 'online'
             })
         
-        # Sort by timestamp
-        activities.sort(key=lambda x: x['timestamp'], reverse=True)
-        
-        conn.close()
-        return jsonify(activities[:10])  # Return top 10
+        return jsonify({'success': True})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/activity', methods=['GET'])
+def get_activity():
+    """Get recent activity, newest first, one page at a time"""
+    try:
+        try:
+            limit = min(max(int(request.args.get('limit', 10)), 1), ACTIVITY_PAGE_LIMIT)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+
+        types = [t for t in request.args.get('types', '').split(',') if t]
+
+        try:
+            activities, next_cursor = activity_log.page(limit, request.args.get('cursor'), types)
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+        return jsonify({
+            'activities': activities,
+            'next_cursor': next_cursor
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/search', methods=['GET'])
+def search_records():
+    """Ranked prefix search over customers, devices, support codes and packages"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'Search query (q) is required'}), 400
+
+        try:
+            limit = min(max(int(request.args.get('limit', 20)), 1), SEARCH_MAX_RESULTS)
+        except ValueError:
+            return jsonify({'error': 'limit must be an integer'}), 400
+
+        kinds = [kind for kind in request.args.get('kinds', '').split(',') if kind]
+        for kind in kinds:
+            if kind not in search_index.KINDS:
+                return jsonify({'error': f"kinds must be among {', '.join(search_index.KINDS)}"}), 400
+
+        return jsonify({
+            'query': query,
+            'results': search_index.search(db, query, kinds, limit)
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/connect', methods=['POST'])
 def initiate_connection():
     """Initiate connection to a device"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         device_id = data.get('device_id')
         connection_type = data.get('connection_type', 'desktop')
+        technician_id = data.get('technician_id')
 
         if not device_id:
             return jsonify({'error': 'Device ID is required'}), 400
 
-        # Get device information
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            SELECT customer_name, device_name, last_seen
-            FROM devices
-            WHERE id = ?
-        ''', (device_id,))
+        # Device, online flag and permanent password in one query
+        device = db.fetchone(DEVICE_CONNECTION_SQL, (device_id,))
 
-        device = cursor.fetchone()
         if not device:
             return jsonify({'error': 'Device not found'}), 404
 
-        # Check if device is online
-        cursor.execute('''
-            SELECT last_seen > datetime('now', '-5 minutes') as is_online
-            FROM devices
-            WHERE id = ?
-        ''', (device_id,))
-
-        is_online = cursor.fetchone()[0]
-        if not is_online:
+        # The heartbeat buffer knows about pings not yet flushed to the table
+        if not (heartbeats.is_online(device_id) or device[2]):
             return jsonify({'error': 'Device is not online'}), 400
 
-        # Get permanent password for device
-        cursor.execute('''
-            SELECT code FROM support_codes sc
-            JOIN devices d ON d.support_code = sc.code
-            WHERE d.id = ?
-        ''', (device_id,))
-
-        support_code_row = cursor.fetchone()
-        permanent_password = f"CA{support_code_row[0]}!" if support_code_row else "ConnectAssist2024!"
+        permanent_password = f"CA{device[3]}!" if device[3] else "ConnectAssist2024!"
 
         # Log connection attempt
-        cursor.execute('''
-            INSERT INTO connection_logs (device_id, connection_type, status)
-            VALUES (?, ?, 'active')
-        ''', (device_id, connection_type))
-
-        conn.commit()
-        conn.close()
+        with db.transaction() as cursor:
+            cursor.execute('''
+                INSERT INTO connection_logs (device_id, technician_id, connection_type, status)
+                VALUES (?, ?, ?, 'active')
+            ''', (device_id, technician_id, connection_type))
+            session_id = cursor.lastrowid
+        dashboard_stats.session_started()
+        notify('session_started', {
+            'session_id': session_id,
+            'device_id': device_id,
+            'customer_name': device[0],
+            'device_name': device[1],
+            'connection_type': connection_type
+        })
 
         return jsonify({
             'success': True,
+            'session_id': session_id,
             'connection_info': {
                 'device_id': device_id,
                 'password': permanent_password,
@@ -581,6 +988,96 @@ def initiate_connection():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+SESSION_END_STATUSES = ('completed', 'failed', 'cancelled')
+
+@app.route('/api/sessions/<int:session_id>', methods=['PATCH'])
+def end_session(session_id):
+    """Close a connection session, recording when it ended and how long it ran"""
+    try:
+        data = request.get_json(silent=True) or {}
+        status = data.get('status', 'completed')
+
+        if status not in SESSION_END_STATUSES:
+            return jsonify({'error': f"status must be one of {', '.join(SESSION_END_STATUSES)}"}), 400
+
+        with db.transaction() as cursor:
+            cursor.execute('''
+                UPDATE connection_logs
+                SET status = ?,
+                    ended_at = datetime('now'),
+                    duration = CAST(ROUND((julianday('now') - julianday(started_at)) * 86400) AS INTEGER)
+                WHERE id = ? AND status = 'active'
+            ''', (status, session_id))
+            closed = cursor.rowcount
+            cursor.execute('''
+                SELECT cl.id, cl.device_id, cl.technician_id, cl.connection_type, cl.started_at,
+                       cl.ended_at, cl.duration, cl.status, d.customer_name, d.device_name
+                FROM connection_logs cl
+                LEFT JOIN devices d ON d.id = cl.device_id
+                WHERE cl.id = ?
+            ''', (session_id,))
+            row = cursor.fetchone()
+
+        if not row:
+            return jsonify({'error': 'Session not found'}), 404
+        if not closed:
+            return jsonify({'error': 'Session already ended', 'status': row[7]}), 409
+
+        session = {
+            'session_id': row[0],
+            'device_id': row[1],
+            'technician_id': row[2],
+            'connection_type': row[3],
+            'started_at': row[4],
+            'ended_at': row[5],
+            'duration': row[6],
+            'status': row[7],
+            'customer_name': row[8],
+            'device_name': row[9]
+        }
+        dashboard_stats.session_ended()
+        notify('session_ended', session)
+
+        return jsonify({'success': True, 'session': session})
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/reports/sessions', methods=['GET'])
+def get_session_report():
+    """Session counts and durations per time bucket, served from the rollups"""
+    try:
+        granularity = request.args.get('granularity', 'day')
+        dimension = request.args.get('dimension', 'all')
+
+        if granularity not in GRANULARITIES:
+            return jsonify({'error': f"granularity must be one of {', '.join(GRANULARITIES)}"}), 400
+        if dimension not in DIMENSIONS:
+            return jsonify({'error': f"dimension must be one of {', '.join(DIMENSIONS)}"}), 400
+
+        # Default to the last 30 days; buckets are UTC
+        now = datetime.utcnow()
+        try:
+            since = parse_timestamp(request.args.get('since') or now - timedelta(days=30))
+            until = parse_timestamp(request.args.get('until') or now + timedelta(days=1))
+        except ValueError:
+            return jsonify({'error': 'since and until must be ISO timestamps'}), 400
+        since = since.strftime(GRANULARITIES[granularity][0])
+        until = until.strftime('%Y-%m-%d %H:%M:%S')
+
+        return jsonify({
+            'granularity': granularity,
+            'dimension': dimension,
+            'since': since,
+            'until': until,
+            'watermark': session_rollups.watermark(),
+            'buckets': session_rollups.report(granularity, dimension, since, until,
+                                              request.args.get('value'))
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 # Customer API Endpoints
 @app.route('/api/customer/installer', methods=['POST'])
 def generate_customer_installer():
@@ -595,22 +1092,69 @@ def generate_customer_installer():
         if len(support_code) != 6 or not support_code.isdigit():
             return jsonify({'error': 'Support code must be exactly 6 digits'}), 400
 
-        # Validate support code
-        conn = sqlite3.connect(DATABASE_PATH)
-        cursor = conn.cursor()
+        # Validated codes with a recorded package are served from memory
+        cached = installer_cache.get(support_code)
+        if cached is None:
+            code_data = db.fetchone(LIVE_CODE_SQL, (support_code,))
+            
+            if not code_data:
+                return jsonify({'error': 'Invalid or expired support code'}), 400
+            
+            # Extract customer data
+            customer_data = {
+                'customer_name': code_data[1],
+                'customer_email': code_data[2],
+                'customer_phone': code_data[3],
+                'session_notes': code_data[4]
+            }
+            
+            # Check if installer already exists
+            existing_package = db.fetchone(LATEST_CODE_PACKAGE_SQL, (support_code,))
+            
+            if existing_package:
+                cached = installer_cache.put(support_code, customer_data, code_data[5], existing_package[0])
+        else:
+            customer_data = cached['customer_data']
+        
+        if cached:
+            # Packages are streamed, so the recorded package is always available;
+            # the download timestamp is written behind the request
+            download_tracker.record(cached['package_id'])
+            
+            return jsonify({
+                'success': True,
+                'download_url': f'/api/installer/{support_code}/download',
+                'customer_data': customer_data,
+                'support_code': support_code
+            })
+        
+        # Wait for a build already queued for this code, otherwise build now
+        package_result = package_queue.wait_for_code(support_code, timeout=120)
+        if package_result is None:
+            package_result = admin_api.create_client_package(support_code, customer_data)
 
-        cursor.execute('''
-            SELECT id, customer_name, customer_email, customer_phone, session_notes, expires_at
-            FROM support_codes
-            WHERE code = ? AND expires_at > datetime('now') AND status = 'active'
-        ''', (support_code,))
+        if package_result['success']:
+            return jsonify({
+                'success': True,
+                'download_url': package_result['download_url'],
+                'customer_data': customer_data,
+                'support_code': support_code
+            })
+        else:
+            return jsonify({'error': package_result['error']}), 500
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/installer/<support_code>/download', methods=['GET'])
+def download_customer_installer(support_code):
+    """Send the installer ZIP for a support code, honouring Range and conditional requests"""
+    try:
+        code_data = db.fetchone(LIVE_CODE_SQL, (support_code,))
 
-        code_data = cursor.fetchone()
         if not code_data:
-            conn.close()
-            return jsonify({'error': 'Invalid or expired support code'}), 400
+            return jsonify({'error': 'Invalid or expired support code'}), 404
 
-        # Extract customer data
         customer_data = {
             'customer_name': code_data[1],
             'customer_email': code_data[2],
@@ -618,51 +1162,68 @@ def generate_customer_installer():
             'session_notes': code_data[4]
         }
 
-        # Check if installer already exists
-        cursor.execute('''
-            SELECT package_path, package_name FROM client_packages
-            WHERE support_code = ?
-            ORDER BY created_at DESC
-            LIMIT 1
-        ''', (support_code,))
+        package = admin_api.create_package_stream(support_code, customer_data, code_data[5])
+        digest = package_digest(package, package_templates.file_digest(package.base_path))
+        etag, mtime = file_validators(digest, package.size)
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'ETag': f'"{etag}"',
+            'Last-Modified': http_date(mtime),
+            # The old Last-Modified would let caches reuse the file heuristically;
+            # every fetch must revalidate so the live-code check above runs
+            'Cache-Control': 'private, no-cache',
+            'Content-Disposition': f'attachment; filename="{admin_api.get_package_name(support_code, customer_data)}"'
+        }
 
-        existing_package = cursor.fetchone()
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return Response(status=304, headers=headers)
 
-        if existing_package and Path(existing_package[0]).exists():
-            # Return existing package
-            package_name = Path(existing_package[0]).name
-            download_url = f'/downloads/{package_name}'
+        # A resume against a different version of the file gets the whole file
+        range_header = request.headers.get('Range')
+        if_range = request.headers.get('If-Range')
+        if if_range and not if_range_matches(if_range, etag, mtime):
+            range_header = None
 
-            # Update download tracking
-            cursor.execute('''
-                UPDATE client_packages
-                SET downloaded_at = datetime('now')
-                WHERE support_code = ? AND package_path = ?
-            ''', (support_code, existing_package[0]))
-            conn.commit()
-            conn.close()
-
-            return jsonify({
-                'success': True,
-                'download_url': download_url,
-                'customer_data': customer_data,
-                'support_code': support_code
-            })
+        try:
+            byte_range = parse_byte_range(range_header, package.size)
+        except ValueError:
+            headers['Content-Range'] = f'bytes */{package.size}'
+            return Response(status=416, headers=headers)
+
+        if not byte_range or byte_range[0] == 0:
+            # Resumed ranges are the same download, so only count the first
+            download_tracker.record_event(
+                support_code,
+                'download',
+                user_agent=request.headers.get('User-Agent'),
+                ip_address=client_address()
+            )
 
-        conn.close()
+        path = installer_files.materialize(package, digest)
 
-        # Generate new installer package
-        package_result = create_client_package(support_code, customer_data)
+        # Behind nginx, hand the transfer (and Range handling) to nginx; it
+        # derives the same ETag and Last-Modified from the file
+        accel_uri = accel_redirect_uri(request.headers, path)
+        if accel_uri:
+            headers['X-Accel-Redirect'] = accel_uri
+            return Response(status=200, headers=headers, mimetype='application/zip')
 
-        if package_result['success']:
-            return jsonify({
-                'success': True,
-                'download_url': package_result['download_url'],
-                'customer_data': customer_data,
-                'support_code': support_code
-            })
+        if byte_range:
+            start, end = byte_range
+            status = 206
+            headers['Content-Range'] = f'bytes {start}-{end}/{package.size}'
         else:
-            return jsonify({'error': package_result['error']}), 500
+            start, end = 0, package.size - 1
+            status = 200
+        headers['Content-Length'] = str(end - start + 1)
+
+        return Response(
+            SendfileBody(path, start, end, request.environ),
+            status=status,
+            headers=headers,
+            mimetype='application/zip',
+            direct_passthrough=True
+        )
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -671,22 +1232,19 @@ def generate_customer_installer():
 def track_download():
     """Track installer downloads for analytics"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         support_code = data.get('support_code')
         timestamp = data.get('timestamp')
 
         if support_code:
-            conn = sqlite3.connect(DATABASE_PATH)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                UPDATE client_packages
-                SET downloaded_at = ?
-                WHERE support_code = ?
-            ''', (timestamp, support_code))
-
-            conn.commit()
-            conn.close()
+            # Buffered and written in batches off the request path
+            download_tracker.record_event(
+                support_code,
+                'beacon',
+                client_timestamp=timestamp,
+                user_agent=request.headers.get('User-Agent'),
+                ip_address=client_address()
+            )
 
         return jsonify({'success': True})
 
@@ -759,5 +1317,52 @@ def deploy_updates():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+# Flush buffered heartbeats, downloads and activity when the process exits
+atexit.register(stop_services)
+
+def main():
+    import argparse
+    from server import serve
+
+    parser = argparse.ArgumentParser(description='ConnectAssist Admin API')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--threads', type=int, default=32,
+                        help='request threads per worker')
+    parser.add_argument('--graceful-timeout', type=int, default=30,
+                        help='seconds a stopping worker waits for in-flight requests')
+    parser.add_argument('--dev', action='store_true',
+                        help='single-process Flask development server with the debugger')
+    args = parser.parse_args()
+
+    try:
+        artifact_fetcher.check_pins()
+    except ArtifactFetchError as e:
+        print(f"❌ {e}")
+        return 1
+
+    if args.dev:
+        # Turn SIGTERM into a normal exit so the atexit flush runs
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        create_app()
+        app.run(host=args.host, port=args.port, debug=True, use_reloader=False)
+        return
+
+    def worker_app(index):
+        # Only the first worker runs the once-per-deployment services; every
+        # worker follows the activity log to see the others' events
+        start_services(singletons=index == 0, follow_activity=args.workers > 1)
+        return app
+
+    serve(worker_app, host=args.host, port=args.port, workers=args.workers,
+          threads=args.threads, graceful_timeout=args.graceful_timeout,
+          on_starting=init_schema,
+          # End event streams first so draining does not wait on them, and
+          # stop services only after in-flight requests have finished
+          on_stopping=lambda server: event_bus.close(),
+          on_exit=lambda server: stop_services())
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    sys.exit(main())
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist ASGI Entry Point
+Serves the admin API from an ASGI server such as uvicorn. Every request is
+answered by the same Flask view as under the WSGI server, run on the async
+SQLite executor, so status codes, headers and JSON bodies are identical.
+Response bodies that can be produced asynchronously (dashboard event
+streams, long polls, installer downloads) are then sent from the event loop,
+so a slow client or an idle stream costs a coroutine instead of a thread.
+
+    uvicorn --factory asgi:create_app --host 0.0.0.0 --port 5001
+"""
+
+import asyncio
+import sys
+from io import BytesIO
+
+from admin_api import (app, admin_api, artifact_fetcher, db, init_schema, start_services,
+                       stop_services)
+from database import AsyncDatabase
+
+# Threads running Flask views (and the queries inside them)
+ASGI_VIEW_THREADS = 32
+
+
+def build_environ(scope, body):
+    """Translate an ASGI HTTP scope and its request body into a WSGI environ"""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0] if client else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = 'HTTP_' + name
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    # The body is fully buffered, so its length is known even for a chunked
+    # request; Flask reads no body without CONTENT_LENGTH
+    environ['CONTENT_LENGTH'] = str(len(body))
+    return environ
+
+
+def call_view(wsgi_app, environ):
+    """Run the WSGI app on an executor thread.
+
+    Returns (status, headers, body): body is bytes, or the response iterable
+    itself when it can be streamed from the event loop.
+    """
+    response = {}
+    written = []
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                               for name, value in headers]
+        return written.append
+
+    body = wsgi_app(environ, start_response)
+    if hasattr(body, '__aiter__') and not written:
+        return response['status'], response['headers'], body
+    try:
+        written.extend(body)
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+    return response['status'], response['headers'], b''.join(written)
+
+
+class AdminASGI:
+    def __init__(self, wsgi_app, executor, on_startup=None, on_shutdown=None, background=()):
+        """
+        wsgi_app: the Flask app whose views answer every request
+        executor: AsyncDatabase the views run on
+        on_startup / on_shutdown: optional callables run on the executor for
+            the ASGI lifespan events
+        background: callables started on the loop's default executor once
+            startup completes, without delaying it
+        """
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+        self.on_startup = on_startup
+        self.on_shutdown = on_shutdown
+        self.background = background
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    if self.on_startup:
+                        await self.executor.run(self.on_startup)
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                loop = asyncio.get_running_loop()
+                for task in self.background:
+                    loop.run_in_executor(None, task)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.on_shutdown:
+                    await self.executor.run(self.on_shutdown)
+                self.executor.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+
+        status, headers, body = await self.executor.run(
+            call_view, self.wsgi_app, build_environ(scope, b''.join(chunks))
+        )
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        if isinstance(body, bytes):
+            await send({'type': 'http.response.body', 'body': body})
+        else:
+            await self._stream(body, receive, send)
+
+    async def _stream(self, body, receive, send):
+        """Send an async body until it ends or the client goes away"""
+        async def pump():
+            async for chunk in body:
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        sending = asyncio.ensure_future(pump())
+        watching = asyncio.ensure_future(disconnected())
+        try:
+            await asyncio.wait([sending, watching], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            sending.cancel()
+            watching.cancel()
+            if hasattr(body, 'close'):
+                body.close()
+        if sending.done() and not sending.cancelled() and sending.exception():
+            raise sending.exception()
+
+
+def create_app(init_db=True, singletons=True, follow_activity=False, threads=ASGI_VIEW_THREADS):
+    """ASGI app factory; services start and stop with the server's lifespan"""
+    artifact_fetcher.check_pins()
+    if init_db:
+        init_schema()
+
+    def prefetch_package_base():
+        # Fetch the RustDesk binary and build the base archive now rather
+        # than inside the first customer's request
+        try:
+            admin_api.prepare_package_base()
+        except Exception as e:
+            print(f"Package base prefetch failed: {e}")
+
+    return AdminASGI(
+        app,
+        AsyncDatabase(db, max_workers=threads),
+        on_startup=lambda: start_services(singletons=singletons, follow_activity=follow_activity),
+        on_shutdown=stop_services,
+        background=[prefetch_package_base]
+    )
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Support Code Allocator
+Hands out random 6-digit support codes in O(1) without retry loops. Free codes
+live in a swap-remove array with a position index (a dense bitmap of the
+keyspace), so a uniformly random free code is always one pick away however
+full the keyspace gets. Codes return to the free set when they expire.
+"""
+
+import heapq
+import secrets
+import threading
+from array import array
+from datetime import datetime
+
+CODE_DIGITS = 6
+KEYSPACE = 10 ** CODE_DIGITS
+
+
+class KeyspaceExhausted(Exception):
+    pass
+
+
+class CodeAllocator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # _free[:_free_count] holds the free codes; _position[code] is the
+        # code's index in _free, so membership and removal are O(1)
+        self._free = array('I', range(KEYSPACE))
+        self._position = array('I', range(KEYSPACE))
+        self._free_count = KEYSPACE
+        # Heap of (expires_at, code); stale entries are skipped via _expires_at
+        self._expiries = []
+        self._expires_at = {}
+
+    def load(self, db):
+        """Rebuild the live-code set from the database"""
+        rows = db.fetchall('''
+            SELECT code, expires_at FROM support_codes
+            WHERE expires_at > datetime('now') AND status IN ('active', 'pooled')
+        ''')
+        with self._lock:
+            for code, expires_at in rows:
+                if len(code) == CODE_DIGITS and code.isdigit():
+                    self._take(int(code), datetime.fromisoformat(str(expires_at)))
+
+    def _is_free(self, value):
+        return self._position[value] < self._free_count
+
+    def _take(self, value, expires_at):
+        if not self._is_free(value):
+            return
+        index = self._position[value]
+        last = self._free[self._free_count - 1]
+        self._free[index] = last
+        self._position[last] = index
+        self._free[self._free_count - 1] = value
+        self._position[value] = self._free_count - 1
+        self._free_count -= 1
+        self._expires_at[value] = expires_at
+        heapq.heappush(self._expiries, (expires_at, value))
+
+    def _release(self, value):
+        if self._is_free(value):
+            return
+        index = self._position[value]
+        first_taken = self._free[self._free_count]
+        self._free[index] = first_taken
+        self._position[first_taken] = index
+        self._free[self._free_count] = value
+        self._position[value] = self._free_count
+        self._free_count += 1
+        self._expires_at.pop(value, None)
+
+    def _release_expired(self):
+        now = datetime.now()
+        while self._expiries and self._expiries[0][0] <= now:
+            expires_at, value = heapq.heappop(self._expiries)
+            if self._expires_at.get(value) == expires_at:
+                self._release(value)
+
+    def allocate(self, expires_at):
+        """Reserve a random free code until expires_at and return it as a string"""
+        with self._lock:
+            self._release_expired()
+            if not self._free_count:
+                raise KeyspaceExhausted('No free support codes')
+            value = self._free[secrets.randbelow(self._free_count)]
+            self._take(value, expires_at)
+        return f'{value:0{CODE_DIGITS}d}'
+
+    def extend(self, code, expires_at):
+        """Move a reserved code's expiry (a pooled code being claimed)"""
+        with self._lock:
+            value = int(code)
+            if self._is_free(value):
+                self._take(value, expires_at)
+            else:
+                self._expires_at[value] = expires_at
+                heapq.heappush(self._expiries, (expires_at, value))
+
+    def release(self, code):
+        """Return a code to the free set early (revoked or never inserted)"""
+        with self._lock:
+            self._release(int(code))
+
+    def metrics(self):
+        """Keyspace occupancy for monitoring"""
+        with self._lock:
+            self._release_expired()
+            allocated = KEYSPACE - self._free_count
+        return {
+            'keyspace': KEYSPACE,
+            'allocated': allocated,
+            'free': KEYSPACE - allocated,
+            'occupancy': allocated / KEYSPACE
+        }
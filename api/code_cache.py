@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Support Code Cache
+In-process LRU cache of validated support codes for the customer installer
+route, so a customer retrying or refreshing does not re-run the validation
+and package lookups. Entries drop out when the code expires, when it is
+revoked in this process, or after a short TTL that bounds how stale a change
+made by another worker can be.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from dashboard_stats import parse_timestamp
+
+
+class CodeCache:
+    def __init__(self, maxsize=4096, ttl=30.0):
+        """
+        maxsize: most codes kept; the least recently used is evicted first
+        ttl: seconds an entry is trusted before the database is asked again
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, code):
+        """Return the cached entry for code, or None if missing or stale"""
+        with self._lock:
+            entry = self._entries.get(code)
+            if entry is None:
+                return None
+            if entry['cached_at'] + self.ttl <= time.monotonic() or entry['expires_at'] <= datetime.now():
+                del self._entries[code]
+                return None
+            self._entries.move_to_end(code)
+            return entry
+
+    def put(self, code, customer_data, expires_at, package_id):
+        entry = {
+            'customer_data': customer_data,
+            'expires_at': parse_timestamp(expires_at),
+            'package_id': package_id,
+            'cached_at': time.monotonic()
+        }
+        with self._lock:
+            self._entries[code] = entry
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, code):
+        with self._lock:
+            self._entries.pop(code, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
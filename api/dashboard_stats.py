@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Dashboard Statistics
+In-memory aggregate behind GET /api/stats. Counters are updated incrementally
+as codes are created or expire, devices heartbeat and sessions start or end,
+so reading them is O(1). A periodic resync from the database picks up rows
+written outside this process.
+"""
+
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+
+ONLINE_WINDOW = timedelta(minutes=5)
+
+ACTIVE_CODES_SQL = '''
+    SELECT code, expires_at FROM support_codes
+    WHERE expires_at > datetime('now') AND status = 'active'
+'''
+
+ACTIVE_SESSIONS_SQL = '''
+    SELECT COUNT(*) FROM connection_logs WHERE status = 'active'
+'''
+
+
+def parse_timestamp(value):
+    """Parse an SQLite or ISO timestamp into a naive datetime"""
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value).replace('Z', ''))
+
+
+class DashboardStats:
+    def __init__(self, database, ttl=2.0, resync_interval=60.0):
+        """
+        ttl: seconds a computed snapshot is shared between dashboard polls
+        resync_interval: seconds between full reloads from the database
+        """
+        self.db = database
+        self.ttl = ttl
+        self.resync_interval = resync_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._snapshot_at = 0.0
+        self._synced_at = None
+        self._reset()
+
+    def _reset(self):
+        # device_id -> customer_name, and customer_name -> device count
+        self._device_customers = {}
+        self._customer_devices = {}
+        # device_id -> last_seen, plus a heap with one (offline_at, device_id)
+        # entry per online device; an entry made stale by a later heartbeat
+        # is pushed back with the new time when it reaches the top
+        self._online = {}
+        self._online_heap = []
+        # code -> expires_at, plus a heap of (expires_at, code)
+        self._codes = {}
+        self._code_heap = []
+        self._active_sessions = 0
+
+    def _resync(self):
+        """Rebuild every counter from the database"""
+        self._reset()
+        for device_id, customer_name, last_seen in self.db.fetchall('''
+            SELECT id, customer_name, last_seen FROM devices
+        '''):
+            self._add_device(device_id, customer_name)
+            if last_seen:
+                self._mark_seen(device_id, parse_timestamp(last_seen))
+
+        for code, expires_at in self.db.fetchall(ACTIVE_CODES_SQL):
+            self._add_code(code, parse_timestamp(expires_at))
+
+        self._active_sessions = self.db.fetchone(ACTIVE_SESSIONS_SQL)[0]
+        self._synced_at = time.monotonic()
+
+    def _add_device(self, device_id, customer_name):
+        previous = self._device_customers.get(device_id)
+        if device_id in self._device_customers and previous == customer_name:
+            return
+        if previous is not None:
+            self._customer_devices[previous] -= 1
+            if not self._customer_devices[previous]:
+                del self._customer_devices[previous]
+        self._device_customers[device_id] = customer_name
+        if customer_name is not None:
+            self._customer_devices[customer_name] = self._customer_devices.get(customer_name, 0) + 1
+
+    def _mark_seen(self, device_id, last_seen):
+        if last_seen + ONLINE_WINDOW <= datetime.utcnow():
+            return
+        previous = self._online.get(device_id)
+        if previous is None:
+            heapq.heappush(self._online_heap, (last_seen + ONLINE_WINDOW, device_id))
+        elif last_seen <= previous:
+            return
+        self._online[device_id] = last_seen
+
+    def _add_code(self, code, expires_at):
+        self._codes[code] = expires_at
+        heapq.heappush(self._code_heap, (expires_at, code))
+
+    def _prune(self):
+        """Drop devices that went offline and codes that expired"""
+        # last_seen is written by SQLite (UTC); expires_at by datetime.now()
+        now_utc = datetime.utcnow()
+        while self._online_heap and self._online_heap[0][0] <= now_utc:
+            _, device_id = heapq.heappop(self._online_heap)
+            offline_at = self._online[device_id] + ONLINE_WINDOW
+            if offline_at <= now_utc:
+                del self._online[device_id]
+            else:
+                heapq.heappush(self._online_heap, (offline_at, device_id))
+
+        now = datetime.now()
+        while self._code_heap and self._code_heap[0][0] <= now:
+            expires_at, code = heapq.heappop(self._code_heap)
+            if self._codes.get(code) == expires_at:
+                del self._codes[code]
+
+    # Incremental updates
+
+    def code_created(self, code, expires_at):
+        with self._lock:
+            self._add_code(code, parse_timestamp(expires_at))
+            self._snapshot = None
+
+    def code_expired(self, code):
+        """Record a code that was expired or revoked before its expiry time"""
+        with self._lock:
+            self._codes.pop(code, None)
+            self._snapshot = None
+
+    def device_seen(self, device_id, customer_name=None, last_seen=None):
+        with self._lock:
+            if customer_name is not None or device_id not in self._device_customers:
+                self._add_device(device_id, customer_name)
+            self._mark_seen(device_id, parse_timestamp(last_seen) if last_seen else datetime.utcnow())
+            self._snapshot = None
+
+    def session_started(self):
+        with self._lock:
+            self._active_sessions += 1
+            self._snapshot = None
+
+    def session_ended(self, count=1):
+        with self._lock:
+            self._active_sessions = max(0, self._active_sessions - count)
+            self._snapshot = None
+
+    # Reads
+
+    def get(self):
+        """Return the dashboard counters, shared between callers for ttl seconds"""
+        now = time.monotonic()
+        with self._lock:
+            if self._snapshot is not None and now - self._snapshot_at < self.ttl:
+                return self._snapshot
+            if self._synced_at is None or now - self._synced_at >= self.resync_interval:
+                self._resync()
+            self._prune()
+            self._snapshot = {
+                'online_devices': len(self._online),
+                'total_customers': len(self._customer_devices),
+                'active_codes': len(self._codes),
+                'active_sessions': self._active_sessions
+            }
+            self._snapshot_at = now
+            return self._snapshot
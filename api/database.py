@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Database Access
+Shared SQLite connection pool used by the admin API routes and background workers
+"""
+
+import asyncio
+import functools
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class Database:
+    """Hands out pooled, WAL-mode SQLite connections with one connection per thread.
+
+    A thread picks up a connection the first time it touches the database and
+    keeps it until release() is called (the Flask app does this on request
+    teardown), so a request reuses one connection instead of reconnecting for
+    every query. Connections run in autocommit mode: plain reads never hold a
+    transaction open, and writes go through transaction().
+    """
+
+    def __init__(self, path, pool_size=8, busy_timeout_ms=5000,
+                 cache_size_kb=16384, mmap_size=256 * 1024 * 1024,
+                 cached_statements=256):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue(maxsize=pool_size)
+        self._local = threading.local()
+
+    def _connect(self):
+        """Open a new connection and apply the performance pragmas"""
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout_ms)}')
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
+
+    def connection(self):
+        """Get the connection bound to the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    def release(self):
+        """Return the current thread's connection to the pool"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        """Close every idle pooled connection"""
+        self.release()
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def execute(self, sql, params=()):
+        """Run a single statement and return its cursor"""
+        return self.connection().execute(sql, params)
+
+    def fetchone(self, sql, params=()):
+        return self.execute(sql, params).fetchone()
+
+    def fetchall(self, sql, params=()):
+        return self.execute(sql, params).fetchall()
+
+    @contextmanager
+    def transaction(self):
+        """Run the enclosed statements in one write transaction.
+
+        BEGIN IMMEDIATE takes the writer lock up front so concurrent writers
+        queue on busy_timeout instead of failing halfway through. Nested
+        calls join the outer transaction.
+        """
+        conn = self.connection()
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn.cursor()
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn.execute('BEGIN IMMEDIATE')
+        self._local.depth = 1
+        try:
+            yield conn.cursor()
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        finally:
+            self._local.depth = 0
+
+
+class AsyncDatabase:
+    """Runs blocking database work for asyncio code on a bounded thread pool.
+
+    Each executor thread keeps the connection it picks up, so max_workers
+    also bounds how many connections the event loop side holds open.
+    Callables run whole on one thread, so a function may use transaction().
+    """
+
+    def __init__(self, database, max_workers=8):
+        self.db = database
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='sqlite')
+
+    async def run(self, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) on the executor and await its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Download Tracking
+Write-behind queue for client package downloads. Requests only record the
+download in memory; a background thread writes each batch to SQLite in one
+transaction, every few hundred milliseconds or as soon as enough events are
+queued. Every event is kept in download_events, and repeat downloads of the
+same package between flushes collapse into a single downloaded_at update.
+"""
+
+import threading
+from datetime import datetime
+
+from heartbeats import utc_timestamp
+
+CODE_DOWNLOADED_SQL = '''
+    UPDATE client_packages
+    SET downloaded_at = ?
+    WHERE support_code = ?
+'''
+
+PACKAGE_DOWNLOADED_SQL = '''
+    UPDATE client_packages
+    SET downloaded_at = ?
+    WHERE id = ?
+'''
+
+
+class DownloadTracker:
+    def __init__(self, database, flush_interval=0.25, max_batch=500):
+        """
+        flush_interval: seconds between batched writes
+        max_batch: queued events that trigger an early flush
+        """
+        self.db = database
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._lock = threading.Lock()
+        self._packages = {}
+        self._events = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='download-tracker', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread and write out anything still queued"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def record(self, package_id, downloaded_at=None):
+        """Queue a downloaded_at update for a client_packages row"""
+        timestamp = downloaded_at or utc_timestamp(datetime.utcnow())
+        with self._lock:
+            self._packages[package_id] = timestamp
+
+    def record_event(self, support_code, source, client_timestamp=None,
+                     user_agent=None, ip_address=None):
+        """Queue a download event for the history table"""
+        event = {
+            'support_code': support_code,
+            'source': source,
+            'downloaded_at': utc_timestamp(datetime.utcnow()),
+            'client_timestamp': client_timestamp,
+            'user_agent': user_agent,
+            'ip_address': ip_address
+        }
+        with self._lock:
+            self._events.append(event)
+            pending = len(self._events)
+        if pending >= self.max_batch:
+            self._wake.set()
+
+    def flush(self):
+        """Write every queued download in one transaction"""
+        with self._lock:
+            packages, self._packages = self._packages, {}
+            events, self._events = self._events, []
+        if not packages and not events:
+            return 0
+
+        # Latest event per code sets the package's downloaded_at
+        latest = {}
+        for event in events:
+            latest[event['support_code']] = event['downloaded_at']
+
+        try:
+            with self.db.transaction() as cursor:
+                cursor.executemany('''
+                    INSERT INTO download_events (support_code, source, downloaded_at,
+                                                 client_timestamp, user_agent, ip_address)
+                    VALUES (:support_code, :source, :downloaded_at,
+                            :client_timestamp, :user_agent, :ip_address)
+                ''', events)
+                cursor.executemany(CODE_DOWNLOADED_SQL, [(timestamp, code) for code, timestamp in latest.items()])
+                cursor.executemany(PACKAGE_DOWNLOADED_SQL, [(timestamp, package_id) for package_id, timestamp in packages.items()])
+        except Exception:
+            # Re-queue the batch ahead of anything recorded since
+            with self._lock:
+                for package_id, timestamp in packages.items():
+                    self._packages.setdefault(package_id, timestamp)
+                self._events[:0] = events
+            raise
+        return len(packages) + len(events)
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                self._wake.wait(self.flush_interval)
+                self._wake.clear()
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Download tracking flush failed: {e}")
+        finally:
+            self.db.release()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Event Bus
+In-process publish/subscribe channel behind the dashboard push stream. Every
+event is serialized once into a shared ring buffer; subscribers wait on a
+condition and read from that buffer, so publishing costs the same no matter
+how many dashboards are connected. Subscribers can wait from a thread or,
+under the ASGI entry point, from a coroutine. Under the WSGI servers every
+open stream or pending long poll holds a request thread, so the number of
+concurrent subscribers can be capped.
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque
+from datetime import datetime
+
+
+class EventBus:
+    def __init__(self, history=512, max_subscribers=None):
+        """
+        history: number of recent events kept for resuming subscribers
+        max_subscribers: open streams and long polls allowed at once
+            (None for no limit)
+        """
+        self.max_subscribers = max_subscribers
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history)
+        self._last_id = 0
+        self._closed = False
+        self._subscribers = 0
+        # Wake-up callbacks of coroutines in wait_async
+        self._waiters = set()
+
+    @property
+    def last_id(self):
+        return self._last_id
+
+    def close(self):
+        """End every open stream (server shutdown)"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            self._wake_waiters()
+
+    def _acquire(self):
+        """Claim a subscriber slot; False when the limit is reached"""
+        with self._cond:
+            if self.max_subscribers is not None and self._subscribers >= self.max_subscribers:
+                return False
+            self._subscribers += 1
+            return True
+
+    def _release(self):
+        with self._cond:
+            self._subscribers -= 1
+
+    def _wake_waiters(self):
+        for wake in self._waiters:
+            wake()
+
+    def publish(self, event_type, data=None):
+        """Append an event and wake every waiting subscriber"""
+        payload = json.dumps({
+            'type': event_type,
+            'data': data,
+            'timestamp': datetime.now().isoformat()
+        }, default=str)
+        with self._cond:
+            self._last_id += 1
+            self._events.append((self._last_id, event_type, payload))
+            self._cond.notify_all()
+            self._wake_waiters()
+        return self._last_id
+
+    def _collect(self, after_id):
+        """Events newer than after_id and whether some were missed; call with the lock held"""
+        if not self._events or self._last_id <= after_id:
+            return [], False
+        oldest = self._events[0][0]
+        missed = after_id and after_id < oldest - 1
+        return [event for event in self._events if event[0] > after_id], bool(missed)
+
+    def wait(self, after_id, timeout):
+        """Block until there are events newer than after_id or timeout expires.
+
+        Returns (events, missed): events is a list of (id, type, json_payload)
+        tuples, and missed is True when after_id is no longer in the history
+        (the subscriber fell behind or the server restarted) and the client
+        should reload its state.
+        """
+        with self._cond:
+            if after_id > self._last_id:
+                # Event ids from before a restart
+                return [], True
+            self._cond.wait_for(lambda: self._last_id > after_id or self._closed, timeout)
+            return self._collect(after_id)
+
+    async def wait_async(self, after_id, timeout):
+        """Coroutine version of wait() that does not hold a thread while waiting"""
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(ready.set)
+            except RuntimeError:
+                # Event loop already closed
+                pass
+
+        with self._cond:
+            if after_id > self._last_id:
+                return [], True
+            pending = not (self._last_id > after_id or self._closed)
+            if pending:
+                self._waiters.add(wake)
+        if pending:
+            try:
+                await asyncio.wait_for(ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with self._cond:
+                    self._waiters.discard(wake)
+        with self._cond:
+            return self._collect(after_id)
+
+    def stream(self, after_id=None, topics=None, keepalive=15):
+        """text/event-stream body for one subscriber, or None when the
+        subscriber limit is reached"""
+        if not self._acquire():
+            return None
+        return EventStream(self, self._last_id if after_id is None else after_id,
+                           topics, keepalive)
+
+    def poll(self, after_id, timeout, topics=None, dumps=json.dumps):
+        """Long-poll body for one subscriber, or None when the subscriber
+        limit is reached"""
+        if not self._acquire():
+            return None
+        return LongPoll(self, after_id, timeout, topics, dumps)
+
+
+class Subscription:
+    """Response body holding one of the bus's subscriber slots until the
+    server closes it"""
+
+    def __init__(self, bus):
+        self.bus = bus
+        self._released = False
+
+    def close(self):
+        if not self._released:
+            self._released = True
+            self.bus._release()
+
+
+class EventStream(Subscription):
+    """Server-Sent Events body, iterable from a WSGI server or an ASGI event loop"""
+
+    def __init__(self, bus, after_id, topics=None, keepalive=15):
+        super().__init__(bus)
+        self.after_id = after_id
+        self.topics = topics
+        self.keepalive = keepalive
+
+    def _frames(self, events, missed):
+        frames = []
+        if missed:
+            if not events:
+                self.after_id = self.bus.last_id
+            frames.append('event: resync\ndata: {}\n\n')
+        if not events:
+            # Comment line keeps proxies from closing an idle stream
+            frames.append(': keepalive\n\n')
+        for event_id, event_type, payload in events:
+            self.after_id = event_id
+            if self.topics and event_type not in self.topics:
+                continue
+            frames.append(f'id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n')
+        return ''.join(frames).encode('utf-8')
+
+    def __iter__(self):
+        yield b'retry: 5000\n\n'
+        while not self.bus._closed:
+            frames = self._frames(*self.bus.wait(self.after_id, self.keepalive))
+            if frames:
+                yield frames
+
+    async def __aiter__(self):
+        yield b'retry: 5000\n\n'
+        while not self.bus._closed:
+            frames = self._frames(*await self.bus.wait_async(self.after_id, self.keepalive))
+            if frames:
+                yield frames
+
+
+class LongPoll(Subscription):
+    """Long-poll body: waits for events newer than after_id, then yields one JSON document"""
+
+    def __init__(self, bus, after_id, timeout, topics=None, dumps=json.dumps):
+        super().__init__(bus)
+        self.after_id = after_id
+        self.timeout = timeout
+        self.topics = topics
+        self.dumps = dumps
+
+    def _document(self, events, missed):
+        if events:
+            last_id = events[-1][0]
+        else:
+            last_id = self.bus.last_id if missed else self.after_id
+        return (self.dumps({
+            'events': [{**json.loads(payload), 'id': event_id}
+                       for event_id, event_type, payload in events
+                       if not self.topics or event_type in self.topics],
+            'last_id': last_id,
+            'resync': missed
+        }) + '\n').encode('utf-8')
+
+    def __iter__(self):
+        yield self._document(*self.bus.wait(self.after_id, self.timeout))
+
+    async def __aiter__(self):
+        yield self._document(*await self.bus.wait_async(self.after_id, self.timeout))
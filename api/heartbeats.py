@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Heartbeat Ingestion
+Buffers device heartbeats in memory and writes them to SQLite in batched
+transactions. Repeat pings from the same device between flushes collapse into
+one row update, and an in-memory online set answers "is this device online"
+without touching the database.
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+ONLINE_WINDOW = timedelta(minutes=5)
+DEVICE_FIELDS = ('support_code', 'customer_name', 'device_name', 'os')
+
+
+def utc_timestamp(value):
+    """Format a UTC datetime the way SQLite's datetime('now') does"""
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class HeartbeatBuffer:
+    def __init__(self, database, flush_interval=1.0, on_flush=None):
+        """
+        flush_interval: seconds between batched writes
+        on_flush: optional callable(list of device dicts) run after each flush;
+            each dict carries the device's stored customer_name, even when
+            the heartbeats themselves did not send one
+        """
+        self.db = database
+        self.flush_interval = flush_interval
+        self.on_flush = on_flush
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._online = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load_online(self):
+        """Seed the online set from devices seen within the online window"""
+        rows = self.db.fetchall('''
+            SELECT id, last_seen FROM devices
+            WHERE last_seen > datetime('now', '-5 minutes')
+        ''')
+        with self._lock:
+            for device_id, last_seen in rows:
+                self._online[device_id] = datetime.fromisoformat(last_seen)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='heartbeat-flush', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread and write out anything still buffered"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def record(self, device_id, info=None):
+        """Buffer one heartbeat. Returns True if the device just came online."""
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._pending.get(device_id)
+            if entry is None:
+                entry = self._pending[device_id] = {'id': device_id}
+            for field in DEVICE_FIELDS:
+                if info and info.get(field):
+                    entry[field] = info[field]
+            entry['last_seen'] = utc_timestamp(now)
+
+            previous = self._online.get(device_id)
+            self._online[device_id] = now
+        return previous is None or previous + ONLINE_WINDOW <= now
+
+    def is_online(self, device_id):
+        with self._lock:
+            last_seen = self._online.get(device_id)
+        return last_seen is not None and last_seen + ONLINE_WINDOW > datetime.utcnow()
+
+    def flush(self):
+        """Write every buffered heartbeat in one transaction"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+
+        devices = list(batch.values())
+        try:
+            self._write(devices)
+        except Exception:
+            # Put the batch back so the next flush retries it
+            with self._lock:
+                for device_id, entry in batch.items():
+                    newer = self._pending.get(device_id)
+                    self._pending[device_id] = {**entry, **newer} if newer else entry
+            raise
+
+        if self.on_flush:
+            self.on_flush(devices)
+        return len(devices)
+
+    def _write(self, devices):
+        with self.db.transaction() as cursor:
+            cursor.executemany('''
+                INSERT INTO devices (id, support_code, customer_name, device_name, os, last_seen)
+                VALUES (
+                    :id, :support_code,
+                    COALESCE(:customer_name, (
+                        SELECT customer_name FROM support_codes
+                        WHERE code = :support_code
+                        ORDER BY id DESC LIMIT 1
+                    )),
+                    :device_name, :os, :last_seen
+                )
+                ON CONFLICT(id) DO UPDATE SET
+                    last_seen = excluded.last_seen,
+                    support_code = COALESCE(excluded.support_code, devices.support_code),
+                    customer_name = COALESCE(excluded.customer_name, devices.customer_name),
+                    device_name = COALESCE(excluded.device_name, devices.device_name),
+                    os = COALESCE(excluded.os, devices.os)
+            ''', [{field: device.get(field) for field in ('id', 'last_seen') + DEVICE_FIELDS}
+                  for device in devices])
+
+            # Most heartbeats carry only a support code; read back the name
+            # the upsert resolved or kept, for on_flush
+            unnamed = {device['id']: device for device in devices if not device.get('customer_name')}
+            if unnamed:
+                placeholders = ','.join('?' * len(unnamed))
+                cursor.execute(f'''
+                    SELECT id, customer_name FROM devices
+                    WHERE id IN ({placeholders}) AND customer_name IS NOT NULL
+                ''', list(unnamed))
+                for device_id, customer_name in cursor.fetchall():
+                    unnamed[device_id]['customer_name'] = customer_name
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"Heartbeat flush failed: {e}")
+        finally:
+            self.db.release()
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Installer Files
+Writes each code's package (see package_stream.py) to disk once, named by
+its content hash, so installer bytes can be sent without passing through
+Python: behind nginx the API answers with X-Accel-Redirect and nginx serves
+the file, and standalone the file is sent with sendfile. The base archive
+slice is copied into the file in the kernel as well (copy_file_range).
+
+A file's mtime is derived from its content hash and never changes, and the
+ETag has nginx's "<mtime>-<size>" form. nginx therefore computes the same
+ETag and Last-Modified as the API, and If-Range and If-None-Match are
+evaluated identically whichever of them sends the file. How recently a file
+was served is kept in a ".used" sidecar instead.
+"""
+
+import asyncio
+import hashlib
+import os
+import socket
+import tempfile
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+
+from package_stream import CHUNK_SIZE
+
+# Refresh a served file's ".used" sidecar at most this often, so the idle
+# period before collection covers files that are still being downloaded
+TOUCH_INTERVAL = 600
+
+# Installer mtimes are this plus the top MTIME_BITS of the content hash
+# (1990 to 2024). nginx's ETag can only carry the mtime and size, so this is
+# as much of the hash as it can hold while Last-Modified stays in the past.
+MTIME_BASE = 631_152_000
+MTIME_BITS = 30
+
+
+def package_digest(package, base_digest):
+    """Content hash of a ZipStream: the base archive content and every
+    generated byte (local headers, deflated entries, central directory)"""
+    sha = hashlib.sha256(base_digest.encode('ascii'))
+    for segment in package.segments:
+        if isinstance(segment, tuple):
+            sha.update(f'{segment[1]}:{segment[2]};'.encode('ascii'))
+        else:
+            sha.update(segment)
+    return sha.hexdigest()[:40]
+
+
+def file_validators(digest, size):
+    """(etag, mtime) of the installer file for a package digest and size;
+    etag is nginx's format for a file with that mtime and size"""
+    mtime = MTIME_BASE + (int(digest[:8], 16) >> (32 - MTIME_BITS))
+    return f'{mtime:x}-{size:x}', mtime
+
+
+def http_date(timestamp):
+    return formatdate(timestamp, usegmt=True)
+
+
+def etag_matches(header, etag):
+    """True if an If-None-Match / If-Range header names etag (weak comparison)"""
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    for tag in header.split(','):
+        tag = tag.strip()
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag.strip('"') == etag:
+            return True
+    return False
+
+
+def if_range_matches(header, etag, mtime):
+    """True if an If-Range header (an ETag or an HTTP date) names this file"""
+    header = header.strip()
+    if header.endswith('"'):
+        return not header.startswith('W/') and header.strip('"') == etag
+    try:
+        return parsedate_to_datetime(header).timestamp() == mtime
+    except (TypeError, ValueError):
+        return False
+
+
+def accel_redirect_uri(headers, path):
+    """Internal nginx URI for path, or None when not behind an X-Accel proxy.
+
+    The proxy announces itself the way Rack::Sendfile expects:
+        X-Sendfile-Type: X-Accel-Redirect
+        X-Accel-Mapping: /opt/connectassist/data/installers/=/internal/installers/
+    """
+    if headers.get('X-Sendfile-Type') != 'X-Accel-Redirect':
+        return None
+    path = str(path)
+    for mapping in headers.get('X-Accel-Mapping', '').split(','):
+        directory, _, uri = mapping.strip().partition('=')
+        if directory and uri and path.startswith(directory):
+            return uri + path[len(directory):].lstrip('/')
+    return None
+
+
+def _copy_range(src, dst, offset, length):
+    """Copy length bytes from src at offset to dst's current position"""
+    copy_file_range = getattr(os, 'copy_file_range', None)
+    while length > 0:
+        copied = 0
+        if copy_file_range:
+            try:
+                copied = copy_file_range(src.fileno(), dst.fileno(), min(length, 1 << 30), offset)
+            except OSError:
+                copy_file_range = None
+        if not copied:
+            src.seek(offset)
+            chunk = src.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                raise IOError(f'Base archive truncated: {src.name}')
+            dst.write(chunk)
+            copied = len(chunk)
+        offset += copied
+        length -= copied
+
+
+class InstallerFiles:
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        # digest -> [lock, threads using it]; an entry is dropped only when
+        # no thread holds or waits on its lock
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        # digest -> when this process last touched its sidecar
+        self._touched = {}
+
+    def path_for(self, digest):
+        return self.directory / f'{digest}.zip'
+
+    def materialize(self, package, digest):
+        """Return the path of the package file, writing it if it does not exist"""
+        path = self.path_for(digest)
+        now = time.time()
+        if now - self._touched.get(digest, 0) > TOUCH_INTERVAL or not path.exists():
+            # One writer per file; different files are written concurrently
+            with self._locks_guard:
+                entry = self._locks.setdefault(digest, [threading.Lock(), 0])
+                entry[1] += 1
+            try:
+                with entry[0]:
+                    self._touch(path)
+                    mtime = file_validators(digest, package.size)[1]
+                    try:
+                        if path.stat().st_mtime != mtime:
+                            # Written by an older version, or touched by hand
+                            os.utime(path, (mtime, mtime))
+                    except FileNotFoundError:
+                        self._write(package, path, mtime)
+                    self._touched[digest] = now
+            finally:
+                with self._locks_guard:
+                    entry[1] -= 1
+                    if not entry[1]:
+                        del self._locks[digest]
+        return path
+
+    def _touch(self, path):
+        """Record that path is in use (its own mtime is the Last-Modified)"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path.with_suffix('.used').touch()
+
+    def collect(self, max_idle):
+        """Delete installer files not served for max_idle seconds.
+
+        Returns (files, bytes) reclaimed.
+        """
+        if not self.directory.is_dir():
+            return 0, 0
+        cutoff = time.time() - max_idle
+        with self._locks_guard:
+            # Forget files this process has not served recently; the sidecar
+            # decides whether they are collected
+            for digest in [digest for digest, touched in self._touched.items() if touched <= cutoff]:
+                del self._touched[digest]
+        files = reclaimed = 0
+        for entry in os.scandir(self.directory):
+            name, suffix = os.path.splitext(entry.name)
+            try:
+                if suffix == '.zip':
+                    sidecar = self.directory / f'{name}.used'
+                    try:
+                        last_used = sidecar.stat().st_mtime
+                    except FileNotFoundError:
+                        last_used = 0
+                    if last_used > cutoff:
+                        continue
+                    size = entry.stat().st_size
+                    self._touched.pop(name, None)
+                    os.unlink(entry.path)
+                    files += 1
+                    reclaimed += size
+                    sidecar.unlink(missing_ok=True)
+                elif suffix in ('.used', '.tmp') and entry.stat().st_mtime <= cutoff:
+                    # Sidecars of collected files and writes that never finished
+                    if suffix == '.tmp' or not (self.directory / f'{name}.zip').exists():
+                        os.unlink(entry.path)
+            except FileNotFoundError:
+                # Sidecar already removed with its file above
+                continue
+            except OSError as e:
+                print(f"Could not collect installer file {entry.path}: {e}")
+        return files, reclaimed
+
+    def _write(self, package, path, mtime):
+        fd, tmp_name = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            # Unbuffered, so writes and copy_file_range share the file position
+            with os.fdopen(fd, 'wb', buffering=0) as dst:
+                sources = {}
+                try:
+                    for segment in package.segments:
+                        if isinstance(segment, tuple):
+                            source, offset, length = segment
+                            if source not in sources:
+                                sources[source] = open(source, 'rb')
+                            _copy_range(sources[source], dst, offset, length)
+                        else:
+                            dst.write(segment)
+                finally:
+                    for src in sources.values():
+                        src.close()
+            if os.path.getsize(tmp_name) != package.size:
+                raise IOError(f'Installer file {path.name} has the wrong size')
+            os.utime(tmp_name, (mtime, mtime))
+            os.replace(tmp_name, path)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+
+
+class SendfileBody:
+    """Response body for a byte range of a file.
+
+    On werkzeug's servers (server.py and --dev) iterating it sends the range
+    from the page cache to the client socket with socket.sendfile (the
+    sendfile syscall on plain sockets) once the headers are out; elsewhere
+    it falls back to reading chunks. The ASGI entry point streams it with
+    async reads.
+    """
+
+    def __init__(self, path, start, end, environ=None):
+        self.path = str(path)
+        self.start = start
+        self.length = end - start + 1
+        self.sock = (environ or {}).get('werkzeug.socket')
+
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            if isinstance(self.sock, socket.socket):
+                # An empty chunk makes the server write and flush the headers
+                yield b''
+                self.sock.sendfile(f, self.start, self.length)
+                return
+            f.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    async def __aiter__(self):
+        loop = asyncio.get_running_loop()
+        f = await loop.run_in_executor(None, open, self.path, 'rb')
+        try:
+            f.seek(self.start)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await loop.run_in_executor(None, f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
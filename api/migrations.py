@@ -0,0 +1,558 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Schema Migrations
+Versioned schema for the ConnectAssist database. Each migration runs once, in
+its own transaction, and is recorded in schema_migrations. Run this file with
+--check to verify with EXPLAIN QUERY PLAN that no route query scans a table.
+"""
+
+import sys
+
+import activity
+import dashboard_stats
+import download_tracker
+import package_queue
+import queries
+import search
+import session_rollups
+import sweeper
+import warm_pool
+
+MIGRATIONS = [
+    (1, 'base schema', [
+        '''
+        CREATE TABLE IF NOT EXISTS support_codes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL,
+            customer_name TEXT,
+            customer_email TEXT,
+            customer_phone TEXT,
+            session_notes TEXT,
+            status TEXT DEFAULT 'active'
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS devices (
+            id TEXT PRIMARY KEY,
+            support_code TEXT,
+            customer_name TEXT,
+            device_name TEXT,
+            os TEXT,
+            last_seen TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS admin_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_token TEXT UNIQUE NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMP NOT NULL,
+            technician_name TEXT,
+            ip_address TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS client_packages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            support_code TEXT NOT NULL,
+            package_path TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            downloaded_at TIMESTAMP,
+            customer_name TEXT,
+            customer_email TEXT,
+            customer_phone TEXT,
+            session_notes TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS connection_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT NOT NULL,
+            technician_id TEXT,
+            connection_type TEXT,
+            started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            ended_at TIMESTAMP,
+            duration INTEGER,
+            status TEXT DEFAULT 'active'
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS package_jobs (
+            id TEXT PRIMARY KEY,
+            support_code TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            download_url TEXT,
+            package_name TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (2, 'route query indexes', [
+        # Code validation and collision checks (code = ? AND expires_at > now)
+        'CREATE INDEX IF NOT EXISTS idx_support_codes_code ON support_codes(code, expires_at, status)',
+        # Active code counts
+        "CREATE INDEX IF NOT EXISTS idx_support_codes_active_expiry ON support_codes(expires_at) WHERE status = 'active'",
+        # Activity feed
+        'CREATE INDEX IF NOT EXISTS idx_support_codes_created_at ON support_codes(created_at, customer_name)',
+        'CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON devices(last_seen)',
+        'CREATE INDEX IF NOT EXISTS idx_devices_created_at ON devices(created_at, customer_name, device_name)',
+        'CREATE INDEX IF NOT EXISTS idx_client_packages_code ON client_packages(support_code, created_at)',
+        "CREATE INDEX IF NOT EXISTS idx_connection_logs_active ON connection_logs(device_id) WHERE status = 'active'",
+        'CREATE INDEX IF NOT EXISTS idx_package_jobs_code ON package_jobs(support_code, created_at, status)',
+    ]),
+    (3, 'device keyset pagination', [
+        # Matches ORDER BY IFNULL(last_seen, '') DESC, id DESC in get_devices
+        "CREATE INDEX IF NOT EXISTS idx_devices_seen_order ON devices(IFNULL(last_seen, ''), id)",
+        "CREATE INDEX IF NOT EXISTS idx_devices_customer_seen ON devices(customer_name, IFNULL(last_seen, ''), id)",
+    ]),
+    (4, 'unique live support codes', [
+        # Retire rows left behind by the old check-then-insert generator
+        """
+        UPDATE support_codes SET status = 'expired'
+        WHERE status = 'active' AND expires_at <= datetime('now')
+        """,
+        """
+        UPDATE support_codes SET status = 'expired'
+        WHERE status = 'active' AND id NOT IN (
+            SELECT MAX(id) FROM support_codes WHERE status = 'active' GROUP BY code
+        )
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_support_codes_live_code ON support_codes(code) WHERE status = 'active'",
+    ]),
+    (5, 'warm pool of pooled support codes', [
+        # Pooled codes are live too, so they share the uniqueness guarantee
+        'DROP INDEX IF EXISTS idx_support_codes_live_code',
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_support_codes_live_code ON support_codes(code) WHERE status IN ('active', 'pooled')",
+        # Oldest-first claims and pool size checks
+        "CREATE INDEX IF NOT EXISTS idx_support_codes_pooled_expiry ON support_codes(expires_at) WHERE status = 'pooled'",
+    ]),
+    (6, 'expiry sweeper', [
+        '''
+        CREATE TABLE IF NOT EXISTS connection_log_rollups (
+            day TEXT NOT NULL,
+            device_id TEXT NOT NULL,
+            technician_id TEXT NOT NULL DEFAULT '',
+            connection_type TEXT NOT NULL DEFAULT '',
+            sessions INTEGER NOT NULL DEFAULT 0,
+            total_duration INTEGER NOT NULL DEFAULT 0,
+            max_duration INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, device_id, technician_id, connection_type)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_support_codes_expired ON support_codes(expires_at) WHERE status = 'expired'",
+        'CREATE INDEX IF NOT EXISTS idx_devices_support_code ON devices(support_code)',
+        'CREATE INDEX IF NOT EXISTS idx_client_packages_created_at ON client_packages(created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_client_packages_path ON client_packages(package_path)',
+        'CREATE INDEX IF NOT EXISTS idx_package_jobs_updated_at ON package_jobs(updated_at)',
+        'CREATE INDEX IF NOT EXISTS idx_connection_logs_started_at ON connection_logs(started_at)',
+    ]),
+    (7, 'download event history', [
+        '''
+        CREATE TABLE IF NOT EXISTS download_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            support_code TEXT NOT NULL,
+            source TEXT NOT NULL,
+            downloaded_at TIMESTAMP NOT NULL,
+            client_timestamp TEXT,
+            user_agent TEXT,
+            ip_address TEXT
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_download_events_code ON download_events(support_code, downloaded_at)',
+        'CREATE INDEX IF NOT EXISTS idx_download_events_time ON download_events(downloaded_at)',
+    ]),
+    (8, 'session rollups', [
+        '''
+        CREATE TABLE IF NOT EXISTS session_rollups (
+            granularity TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            bucket TEXT NOT NULL,
+            value TEXT NOT NULL,
+            sessions INTEGER NOT NULL,
+            total_duration INTEGER NOT NULL,
+            max_duration INTEGER NOT NULL,
+            p50_duration INTEGER NOT NULL,
+            p95_duration INTEGER NOT NULL,
+            PRIMARY KEY (granularity, dimension, bucket, value)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS rollup_watermarks (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        # Closed sessions since the watermark, covering started_at for bucketing
+        'CREATE INDEX IF NOT EXISTS idx_connection_logs_ended_at ON connection_logs(ended_at, started_at)',
+    ]),
+    (9, 'activity feed', [
+        '''
+        CREATE TABLE IF NOT EXISTS activity_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT NOT NULL,
+            subject TEXT,
+            data TEXT,
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_activity_events_created_at ON activity_events(created_at DESC, id DESC)',
+        # Seed the feed with the events the old two-query feed showed
+        '''
+        INSERT INTO activity_events (type, subject, data, created_at)
+        SELECT 'code_created', code,
+               json_object('support_code', code, 'customer_name', customer_name), created_at
+        FROM support_codes
+        WHERE status != 'pooled' AND created_at IS NOT NULL
+        ''',
+        '''
+        INSERT INTO activity_events (type, subject, data, created_at)
+        SELECT 'device_registered', id,
+               json_object('device_id', id, 'customer_name', customer_name, 'device_name', device_name),
+               created_at
+        FROM devices
+        WHERE created_at IS NOT NULL
+        ''',
+    ]),
+    (10, 'full-text search', [
+        # rowid = source id * 4 + kind offset (code 1, package 2, device 3)
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            kind UNINDEXED, ref UNINDEXED, status UNINDEXED,
+            customer_name, customer_email, customer_phone, device_name, os,
+            support_code, session_notes,
+            tokenize = 'unicode61', prefix = '2 3'
+        )
+        ''',
+        # Names count most, then device names and codes, then contact details
+        "INSERT INTO search_index (search_index, rank) VALUES ('rank', 'bm25(0, 0, 0, 10, 3, 3, 5, 1, 5, 1)')",
+        '''
+        CREATE TRIGGER IF NOT EXISTS search_support_codes_ai AFTER INSERT ON support_codes
+        WHEN new.status != 'pooled'
+        BEGIN
+            INSERT INTO search_index (rowid, kind, ref, status, customer_name, customer_email,
+                                      customer_phone, support_code, session_notes)
+            VALUES (new.id * 4 + 1, 'code', new.code, new.status, new.customer_name,
+                    new.customer_email, new.customer_phone, new.code, new.session_notes);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS search_support_codes_au
+        AFTER UPDATE OF customer_name, customer_email, customer_phone, session_notes, status ON support_codes
+        WHEN old.customer_name IS NOT new.customer_name OR old.customer_email IS NOT new.customer_email
+          OR old.customer_phone IS NOT new.customer_phone OR old.session_notes IS NOT new.session_notes
+          OR old.status IS NOT new.status
+        BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 4 + 1;
+            INSERT INTO search_index (rowid, kind, ref, status, customer_name, customer_email,
+                                      customer_phone, support_code, session_notes)
+            SELECT new.id * 4 + 1, 'code', new.code, new.status, new.customer_name,
+                   new.customer_email, new.customer_phone, new.code, new.session_notes
+            WHERE new.status != 'pooled';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS search_support_codes_ad AFTER DELETE ON support_codes
+        BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 4 + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS search_client_packages_ai AFTER INSERT ON client_packages
+        BEGIN
+            INSERT INTO search_index (rowid, kind, ref, customer_name, customer_email,
+                                      customer_phone, support_code, session_notes)
+            VALUES (new.id * 4 + 2, 'package', new.id, new.customer_name, new.customer_email,
+                    new.customer_phone, new.support_code, new.session_notes);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS search_client_packages_au
+        AFTER UPDATE OF customer_name, customer_email, customer_phone, session_notes ON client_packages
+        WHEN old.customer_name IS NOT new.customer_name OR old.customer_email IS NOT new.customer_email
+          OR old.customer_phone IS NOT new.customer_phone OR old.session_notes IS NOT new.session_notes
+        BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 4 + 2;
+            INSERT INTO search_index (rowid, kind, ref, customer_name, customer_email,
+                                      customer_phone, support_code, session_notes)
+            VALUES (new.id * 4 + 2, 'package', new.id, new.customer_name, new.customer_email,
+                    new.customer_phone, new.support_code, new.session_notes);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS search_client_packages_ad AFTER DELETE ON client_packages
+        BEGIN
+            DELETE FROM search_index WHERE rowid = old.id * 4 + 2;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS search_devices_ai AFTER INSERT ON devices
+        BEGIN
+            INSERT INTO search_index (rowid, kind, ref, customer_name, device_name, os, support_code)
+            VALUES (new.rowid * 4 + 3, 'device', new.id, new.customer_name, new.device_name,
+                    new.os, new.support_code);
+        END
+        ''',
+        # Heartbeat upserts rewrite these columns with the same values; skip those
+        '''
+        CREATE TRIGGER IF NOT EXISTS search_devices_au
+        AFTER UPDATE OF customer_name, device_name, os, support_code ON devices
+        WHEN old.customer_name IS NOT new.customer_name OR old.device_name IS NOT new.device_name
+          OR old.os IS NOT new.os OR old.support_code IS NOT new.support_code
+        BEGIN
+            DELETE FROM search_index WHERE rowid = old.rowid * 4 + 3;
+            INSERT INTO search_index (rowid, kind, ref, customer_name, device_name, os, support_code)
+            VALUES (new.rowid * 4 + 3, 'device', new.id, new.customer_name, new.device_name,
+                    new.os, new.support_code);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS search_devices_ad AFTER DELETE ON devices
+        BEGIN
+            DELETE FROM search_index WHERE rowid = old.rowid * 4 + 3;
+        END
+        ''',
+        # Index existing rows
+        '''
+        INSERT INTO search_index (rowid, kind, ref, status, customer_name, customer_email,
+                                  customer_phone, support_code, session_notes)
+        SELECT id * 4 + 1, 'code', code, status, customer_name, customer_email,
+               customer_phone, code, session_notes
+        FROM support_codes WHERE status != 'pooled'
+        ''',
+        '''
+        INSERT INTO search_index (rowid, kind, ref, customer_name, customer_email,
+                                  customer_phone, support_code, session_notes)
+        SELECT id * 4 + 2, 'package', id, customer_name, customer_email,
+               customer_phone, support_code, session_notes
+        FROM client_packages
+        ''',
+        '''
+        INSERT INTO search_index (rowid, kind, ref, customer_name, device_name, os, support_code)
+        SELECT rowid * 4 + 3, 'device', id, customer_name, device_name, os, support_code
+        FROM devices
+        ''',
+    ]),
+    (11, 'activity event origin', [
+        # Process that recorded the event, so workers only relay each other's
+        'ALTER TABLE activity_events ADD COLUMN origin INTEGER',
+    ]),
+    (12, 'device keyset on columns', [
+        # Row-value keyset comparisons only seek on plain columns, so store
+        # "never seen" as '' instead of NULL and index last_seen itself
+        "UPDATE devices SET last_seen = '' WHERE last_seen IS NULL",
+        'DROP INDEX IF EXISTS idx_devices_seen_order',
+        'DROP INDEX IF EXISTS idx_devices_customer_seen',
+        'DROP INDEX IF EXISTS idx_devices_last_seen',
+        'CREATE INDEX IF NOT EXISTS idx_devices_seen_id ON devices(last_seen, id)',
+        'CREATE INDEX IF NOT EXISTS idx_devices_customer_seen_id ON devices(customer_name, last_seen, id)',
+    ]),
+    (13, 'connection log status', [
+        # Counting active sessions seeks this instead of walking the whole
+        # partial index on device_id
+        'CREATE INDEX IF NOT EXISTS idx_connection_logs_status ON connection_logs(status)',
+    ]),
+    (14, 'stable device search keys', [
+        # devices has a TEXT primary key, so its implicit rowid can change on
+        # VACUUM; key device search entries on an INTEGER PRIMARY KEY instead
+        '''
+        CREATE TABLE IF NOT EXISTS search_device_keys (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            device_id TEXT NOT NULL UNIQUE
+        )
+        ''',
+        'DROP TRIGGER IF EXISTS search_devices_ai',
+        'DROP TRIGGER IF EXISTS search_devices_au',
+        'DROP TRIGGER IF EXISTS search_devices_ad',
+        "DELETE FROM search_index WHERE kind = 'device'",
+        'INSERT OR IGNORE INTO search_device_keys (device_id) SELECT id FROM devices',
+        '''
+        INSERT INTO search_index (rowid, kind, ref, customer_name, device_name, os, support_code)
+        SELECT k.id * 4 + 3, 'device', d.id, d.customer_name, d.device_name, d.os, d.support_code
+        FROM devices d
+        JOIN search_device_keys k ON k.device_id = d.id
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS search_devices_ai AFTER INSERT ON devices
+        BEGIN
+            INSERT OR IGNORE INTO search_device_keys (device_id) VALUES (new.id);
+            INSERT INTO search_index (rowid, kind, ref, customer_name, device_name, os, support_code)
+            SELECT id * 4 + 3, 'device', new.id, new.customer_name, new.device_name,
+                   new.os, new.support_code
+            FROM search_device_keys WHERE device_id = new.id;
+        END
+        ''',
+        # Heartbeat upserts rewrite these columns with the same values; skip those
+        '''
+        CREATE TRIGGER IF NOT EXISTS search_devices_au
+        AFTER UPDATE OF id, customer_name, device_name, os, support_code ON devices
+        WHEN old.id IS NOT new.id OR old.customer_name IS NOT new.customer_name
+          OR old.device_name IS NOT new.device_name OR old.os IS NOT new.os
+          OR old.support_code IS NOT new.support_code
+        BEGIN
+            DELETE FROM search_index
+            WHERE rowid = (SELECT id * 4 + 3 FROM search_device_keys WHERE device_id = old.id);
+            UPDATE search_device_keys SET device_id = new.id WHERE device_id = old.id;
+            INSERT INTO search_index (rowid, kind, ref, customer_name, device_name, os, support_code)
+            SELECT id * 4 + 3, 'device', new.id, new.customer_name, new.device_name,
+                   new.os, new.support_code
+            FROM search_device_keys WHERE device_id = new.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS search_devices_ad AFTER DELETE ON devices
+        BEGIN
+            DELETE FROM search_index
+            WHERE rowid = (SELECT id * 4 + 3 FROM search_device_keys WHERE device_id = old.id);
+            DELETE FROM search_device_keys WHERE device_id = old.id;
+        END
+        ''',
+    ]),
+]
+
+# Hot route queries checked by --check: the statements the routes and
+# background workers execute, with placeholder parameters
+NOW = '2025-01-01 00:00:00'
+CUTOFF = ('2025-01-01 00:00:00', 500)
+DEVICE_PAGE = {'now': NOW, 'limit': 101, 'cursor_seen': NOW, 'cursor_id': 'device'}
+
+ROUTE_QUERIES = [
+    ('create_support_code: retire stale row', queries.RETIRE_EXPIRED_CODE_SQL, ('123456',)),
+    ('warm_pool.claim', warm_pool.CLAIM_POOLED_SQL, ()),
+    ('warm_pool.available', warm_pool.POOLED_COUNT_SQL, ()),
+    ('stats: active codes', dashboard_stats.ACTIVE_CODES_SQL, ()),
+    ('stats: active sessions', dashboard_stats.ACTIVE_SESSIONS_SQL, ()),
+    ('get_devices', queries.DEVICE_PAGE_SQL.format(
+        where=queries.where_clause([queries.DEVICE_CURSOR_FILTER])),
+     DEVICE_PAGE),
+    ('get_devices: customer', queries.DEVICE_PAGE_SQL.format(where=queries.where_clause([
+        queries.DEVICE_CUSTOMER_FILTER, queries.DEVICE_CURSOR_FILTER])),
+     dict(DEVICE_PAGE, customer='John Smith')),
+    ('get_devices: online', queries.DEVICE_PAGE_SQL.format(where=queries.where_clause([
+        queries.DEVICE_STATUS_FILTERS['online'], queries.DEVICE_CURSOR_FILTER])),
+     DEVICE_PAGE),
+    ('get_devices: since', queries.DEVICE_PAGE_SQL.format(where=queries.where_clause([
+        queries.DEVICE_SINCE_FILTER, queries.DEVICE_CURSOR_FILTER])),
+     dict(DEVICE_PAGE, since=NOW)),
+    ('get_activity', activity.ACTIVITY_PAGE_SQL.format(
+        where=f'WHERE {activity.ACTIVITY_CURSOR_FILTER}'), (NOW, 100, 11)),
+    ('initiate_connection', queries.DEVICE_CONNECTION_SQL, ('device',)),
+    ('generate_customer_installer: code', queries.LIVE_CODE_SQL, ('123456',)),
+    ('generate_customer_installer: package', queries.LATEST_CODE_PACKAGE_SQL, ('123456',)),
+    ('track_download: by code', download_tracker.CODE_DOWNLOADED_SQL, (NOW, '123456')),
+    ('track_download: by package', download_tracker.PACKAGE_DOWNLOADED_SQL, (NOW, 1)),
+    ('sweeper: expire codes', sweeper.EXPIRED_CODES_SQL, (500,)),
+    ('sweeper: stale sessions', sweeper.STALE_SESSIONS_SQL, CUTOFF),
+    ('sweeper: purge codes', sweeper.PURGEABLE_CODES_SQL, CUTOFF),
+    ('sweeper: purge packages', sweeper.PURGEABLE_PACKAGES_SQL, CUTOFF),
+    ('sweeper: purge jobs', sweeper.PURGEABLE_JOBS_SQL, CUTOFF),
+    ('sweeper: purge download events', sweeper.OLD_DOWNLOAD_EVENTS_SQL, CUTOFF),
+    ('sweeper: purge activity', sweeper.OLD_ACTIVITY_SQL, CUTOFF),
+    ('sweeper: compact logs', sweeper.COMPACTABLE_LOGS_SQL, CUTOFF),
+    ('sweeper: referenced file', sweeper.PACKAGE_FILE_REFERENCED_SQL,
+     ('base-0.zip', '/opt/connectassist/data/packages/base-0.zip')),
+    ('session_rollups: closed since watermark', session_rollups.CLOSED_SESSIONS_SQL,
+     (NOW, '2025-01-02 00:00:00')),
+    ('session_rollups: bucket sessions', session_rollups.BUCKET_SESSIONS_SQL,
+     (NOW, '2025-01-01 01:00:00')),
+    ('session_rollups: report', session_rollups.REPORT_SQL.format(
+        value_filter=session_rollups.REPORT_VALUE_FILTER),
+     ('day', 'technician', NOW, '2025-02-01 00:00:00', 'tech')),
+    ('search', search.SEARCH_SQL.format(kinds_filter=search.kinds_filter(['device', 'code'])),
+     ('"john"*', 'device', 'code', 20)),
+    ('package_queue.wait_for_code', package_queue.PENDING_JOB_SQL,
+     ('123456', 'queued', 'building')),
+]
+
+# Tables a plan may scan. FTS5 answers MATCH through its own index, which
+# EXPLAIN reports as a virtual table scan.
+SCAN_ALLOWED = {'search_index'}
+
+def applied_versions(db):
+    db.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    return {row[0] for row in db.fetchall('SELECT version FROM schema_migrations')}
+
+
+def migrate(db):
+    """Apply every pending migration; safe to call from several processes"""
+    applied = applied_versions(db)
+    changed = False
+    for version, name, statements in MIGRATIONS:
+        if version in applied:
+            continue
+        with db.transaction() as cursor:
+            # Another worker may have applied it while we waited for the lock
+            cursor.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,))
+            if cursor.fetchone():
+                continue
+            for statement in statements:
+                if callable(statement):
+                    statement(cursor)
+                else:
+                    cursor.execute(statement)
+            cursor.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)',
+                           (version, name))
+        changed = True
+        print(f"✅ Applied migration {version}: {name}")
+    if changed:
+        # Refresh planner statistics for the new indexes
+        db.execute('ANALYZE')
+
+
+def check_query_plans(db):
+    """Return a list of route queries whose plan scans a table or sorts in a temp b-tree.
+
+    A scan counts even when it walks an index (SCAN ... USING INDEX): it still
+    reads every entry. Only a SEARCH seeks to the rows it needs.
+    """
+    problems = []
+    for name, sql, params in ROUTE_QUERIES:
+        for row in db.fetchall(f'EXPLAIN QUERY PLAN {sql}', params):
+            detail = row[-1]
+            words = detail.split()
+            scan = (words[0] == 'SCAN' and len(words) > 1
+                    and words[1] not in SCAN_ALLOWED)
+            if scan or 'USE TEMP B-TREE' in detail:
+                problems.append(f'{name}: {detail}')
+    return problems
+
+
+def main():
+    import argparse
+    import os
+    from database import Database
+
+    parser = argparse.ArgumentParser(description='ConnectAssist schema migrations')
+    parser.add_argument('--database', default='/opt/connectassist/data/connectassist.db',
+                        help='SQLite database path')
+    parser.add_argument('--check', action='store_true',
+                        help='Fail if any route query plan contains a table scan')
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.database)), exist_ok=True)
+    db = Database(args.database)
+    migrate(db)
+
+    if args.check:
+        problems = check_query_plans(db)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            return 1
+        print(f"✅ All {len(ROUTE_QUERIES)} route queries use indexes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
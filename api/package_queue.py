@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Package Build Queue
+Builds client packages on a bounded background worker pool so support code
+generation never waits on zipping or binary downloads
+"""
+
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Job states reported by GET /api/packages/<job_id>
+QUEUED = 'queued'
+BUILDING = 'building'
+READY = 'ready'
+FAILED = 'failed'
+
+# Newest unfinished job for a support code
+PENDING_JOB_SQL = '''
+    SELECT id FROM package_jobs
+    WHERE support_code = ? AND status IN (?, ?)
+    ORDER BY created_at DESC
+    LIMIT 1
+'''
+
+
+class PackageBuildQueue:
+    def __init__(self, database, build_package, max_workers=2, on_complete=None):
+        """
+        database: shared Database pool
+        build_package: callable(support_code, customer_data) returning the
+            result dict of AdminAPI.create_client_package
+        on_complete: optional callable(job) run once a job is ready or failed
+        """
+        self.db = database
+        self.build_package = build_package
+        self.on_complete = on_complete
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='package-build')
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def submit(self, support_code, customer_data):
+        """Queue a package build and return its job id"""
+        return self.submit_many([(support_code, customer_data)])[0]
+
+    def submit_many(self, items):
+        """Queue builds for (support_code, customer_data) pairs in one transaction.
+
+        Returns the job ids in the same order.
+        """
+        job_ids = [secrets.token_hex(8) for _ in items]
+        with self.db.transaction() as cursor:
+            cursor.executemany('''
+                INSERT INTO package_jobs (id, support_code, status)
+                VALUES (?, ?, ?)
+            ''', [(job_id, support_code, QUEUED)
+                  for job_id, (support_code, _) in zip(job_ids, items)])
+
+        for job_id, (support_code, customer_data) in zip(job_ids, items):
+            future = self._executor.submit(self._run, job_id, support_code, dict(customer_data))
+            with self._lock:
+                self._futures[job_id] = future
+            future.add_done_callback(lambda _, job_id=job_id: self._forget(job_id))
+        return job_ids
+
+    def _forget(self, job_id):
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    def _set_status(self, job_id, status, result=None):
+        result = result or {}
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                UPDATE package_jobs
+                SET status = ?, download_url = ?, package_name = ?, error = ?,
+                    updated_at = datetime('now')
+                WHERE id = ?
+            ''', (status, result.get('download_url'), result.get('package_name'),
+                  result.get('error'), job_id))
+
+    def _run(self, job_id, support_code, customer_data):
+        """Worker body: build the package and record the outcome"""
+        try:
+            self._set_status(job_id, BUILDING)
+            try:
+                result = self.build_package(support_code, customer_data)
+            except Exception as e:
+                result = {'success': False, 'error': str(e)}
+            self._set_status(job_id, READY if result.get('success') else FAILED, result)
+            if self.on_complete:
+                self.on_complete(self.get_status(job_id))
+            return result
+        finally:
+            self.db.release()
+
+    def get_status(self, job_id):
+        """Return the job as a dict, or None if it does not exist"""
+        row = self.db.fetchone('''
+            SELECT id, support_code, status, download_url, package_name, error,
+                   created_at, updated_at
+            FROM package_jobs
+            WHERE id = ?
+        ''', (job_id,))
+        if not row:
+            return None
+        return {
+            'job_id': row[0],
+            'support_code': row[1],
+            'status': row[2],
+            'download_url': row[3],
+            'package_name': row[4],
+            'error': row[5],
+            'created_at': row[6],
+            'updated_at': row[7]
+        }
+
+    def wait_for_code(self, support_code, timeout=None):
+        """Wait for an in-flight build of support_code in this process.
+
+        Returns the build result, or None if no build is pending here.
+        """
+        row = self.db.fetchone(PENDING_JOB_SQL, (support_code, QUEUED, BUILDING))
+        if not row:
+            return None
+        with self._lock:
+            future = self._futures.get(row[0])
+        if future is None:
+            return None
+        return future.result(timeout=timeout)
+
+    def shutdown(self, wait=True):
+        """Stop accepting jobs and optionally drain the queue"""
+        self._executor.shutdown(wait=wait)
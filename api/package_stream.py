@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Package Streaming
+Builds client package ZIPs on the fly while they are sent. Static entries are
+copied as stored, already-compressed bytes from the base archive; per-code
+entries are deflated in memory. The byte layout is fully determined up front,
+so the total size is known and any byte range can be produced on request.
+"""
+
+import struct
+import zipfile
+import zlib
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+END_OF_CENTRAL_DIR = struct.Struct('<IHHHHIIH')
+
+LOCAL_HEADER_SIG = 0x04034b50
+CENTRAL_HEADER_SIG = 0x02014b50
+END_OF_CENTRAL_DIR_SIG = 0x06054b50
+
+ZIP_VERSION = 20
+MADE_BY_UNIX = (3 << 8) | ZIP_VERSION
+UTF8_FLAG = 0x800
+ZIP32_LIMIT = 0xFFFFFFFF
+CHUNK_SIZE = 256 * 1024
+
+
+def _dos_datetime(date_time):
+    year, month, day, hour, minute, second = date_time
+    dos_date = ((max(year, 1980) - 1980) << 9) | (month << 5) | day
+    dos_time = (hour << 11) | (minute << 5) | (second // 2)
+    return dos_time, dos_date
+
+
+class _Entry:
+    def __init__(self, name, method, crc, compress_size, file_size, date_time,
+                 external_attr, data=None, source=None, source_offset=0):
+        self.name = name.encode('utf-8')
+        self.flags = 0 if name.isascii() else UTF8_FLAG
+        self.method = method
+        self.crc = crc
+        self.compress_size = compress_size
+        self.file_size = file_size
+        self.dos_time, self.dos_date = _dos_datetime(date_time)
+        self.external_attr = external_attr
+        self.data = data
+        self.source = source
+        self.source_offset = source_offset
+        self.header_offset = 0
+
+    def local_header(self):
+        return LOCAL_HEADER.pack(
+            LOCAL_HEADER_SIG, ZIP_VERSION, self.flags, self.method,
+            self.dos_time, self.dos_date, self.crc,
+            self.compress_size, self.file_size, len(self.name), 0
+        ) + self.name
+
+    def central_header(self):
+        return CENTRAL_HEADER.pack(
+            CENTRAL_HEADER_SIG, MADE_BY_UNIX, ZIP_VERSION, self.flags, self.method,
+            self.dos_time, self.dos_date, self.crc,
+            self.compress_size, self.file_size, len(self.name), 0, 0, 0, 0,
+            self.external_attr, self.header_offset
+        ) + self.name
+
+
+class ZipStream:
+    """A ZIP archive described as a list of byte segments.
+
+    Each segment is either in-memory bytes or a (path, offset, length) slice
+    of the base archive, which is read lazily while streaming.
+    """
+
+    def __init__(self, base_path, generated_files, date_time):
+        """
+        base_path: base archive from PackageTemplateCache.get_base
+        generated_files: {arcname: text} per-code entries
+        date_time: timestamp tuple for generated entries; keep it stable for
+            a given code so repeated downloads are byte-identical
+        """
+        self.base_path = str(base_path)
+        entries = self._read_base_entries() + [
+            self._deflate_entry(arcname, content, date_time)
+            for arcname, content in generated_files.items()
+        ]
+        self.segments = []
+        offset = 0
+        for entry in entries:
+            entry.header_offset = offset
+            header = entry.local_header()
+            self.segments.append(header)
+            offset += len(header)
+            if entry.data is not None:
+                self.segments.append(entry.data)
+            else:
+                self.segments.append((entry.source, entry.source_offset, entry.compress_size))
+            offset += entry.compress_size
+
+        central_dir = b''.join(entry.central_header() for entry in entries)
+        if offset + len(central_dir) > ZIP32_LIMIT or len(entries) > 0xFFFF:
+            raise ValueError('Package too large for a ZIP32 archive')
+        self.segments.append(central_dir)
+        self.segments.append(END_OF_CENTRAL_DIR.pack(
+            END_OF_CENTRAL_DIR_SIG, 0, 0, len(entries), len(entries),
+            len(central_dir), offset, 0
+        ))
+        self.size = offset + len(central_dir) + END_OF_CENTRAL_DIR.size
+
+    def _read_base_entries(self):
+        """Locate the raw compressed data of every entry in the base archive"""
+        entries = []
+        with zipfile.ZipFile(self.base_path) as zipf, open(self.base_path, 'rb') as f:
+            for info in zipf.infolist():
+                f.seek(info.header_offset)
+                header = LOCAL_HEADER.unpack(f.read(LOCAL_HEADER.size))
+                name_len, extra_len = header[9], header[10]
+                data_offset = info.header_offset + LOCAL_HEADER.size + name_len + extra_len
+                entries.append(_Entry(
+                    info.filename, info.compress_type, info.CRC,
+                    info.compress_size, info.file_size, info.date_time,
+                    info.external_attr, source=self.base_path, source_offset=data_offset
+                ))
+        return entries
+
+    @staticmethod
+    def _deflate_entry(arcname, content, date_time):
+        raw = content.encode('utf-8') if isinstance(content, str) else content
+        compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+        data = compressor.compress(raw) + compressor.flush()
+        return _Entry(arcname, zipfile.ZIP_DEFLATED, zlib.crc32(raw),
+                      len(data), len(raw), date_time, 0o644 << 16, data=data)
+
+    def iter_range(self, start=0, end=None):
+        """Yield the archive bytes from start to end (inclusive)"""
+        if end is None:
+            end = self.size - 1
+        position = 0
+        for segment in self.segments:
+            length = segment[2] if isinstance(segment, tuple) else len(segment)
+            seg_start, seg_end = position, position + length
+            position = seg_end
+            if seg_end <= start:
+                continue
+            if seg_start > end:
+                break
+            lo = max(start, seg_start) - seg_start
+            hi = min(end + 1, seg_end) - seg_start
+            if isinstance(segment, tuple):
+                yield from self._read_slice(segment[0], segment[1] + lo, hi - lo)
+            else:
+                yield segment[lo:hi]
+
+    @staticmethod
+    def _read_slice(path, offset, length):
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            while length > 0:
+                chunk = f.read(min(CHUNK_SIZE, length))
+                if not chunk:
+                    raise IOError(f'Base archive truncated: {path}')
+                length -= len(chunk)
+                yield chunk
+
+
+def parse_byte_range(header, size):
+    """Parse a single-range Range header into (start, end).
+
+    Returns None when there is no usable range (serve the whole file) and
+    raises ValueError when the range cannot be satisfied.
+    """
+    if not header or not header.startswith('bytes='):
+        return None
+    spec = header[len('bytes='):].strip()
+    if ',' in spec:
+        # Multipart ranges are not supported; fall back to the full body
+        return None
+    first, _, last = spec.partition('-')
+    if not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+        if last and end < start:
+            # Syntactically invalid (RFC 9110 14.1.1): ignore the header
+            return None
+    else:
+        start = max(size - int(last), 0)
+        end = size - 1
+    if start >= size or end < start:
+        raise ValueError('Requested range not satisfiable')
+    end = min(end, size - 1)
+    return start, end
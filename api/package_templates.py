@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Package Templates
+Content-addressed cache of prebuilt base archives holding the static package
+files (RustDesk binary and install scripts). Per-code packages reuse the
+already-compressed base entries byte for byte and only deflate the small
+generated files (see package_stream.py).
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import zipfile
+from pathlib import Path
+
+
+class PackageTemplateCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = Path(cache_dir)
+        self._lock = threading.Lock()
+        self._digests = {}
+
+    def file_digest(self, path):
+        """SHA-256 of a file, memoized on (path, size, mtime)"""
+        stat = os.stat(path)
+        memo_key = (str(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(memo_key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+            self._digests[memo_key] = digest
+        return digest
+
+    def template_key(self, static_files):
+        """Hash of every static entry's name and content"""
+        sha = hashlib.sha256()
+        for source, arcname in static_files:
+            sha.update(arcname.encode('utf-8'))
+            sha.update(b'\0')
+            sha.update(self.file_digest(source).encode('ascii'))
+            sha.update(b'\0')
+        return sha.hexdigest()[:32]
+
+    def get_base(self, static_files):
+        """Return the path of the base archive for static_files, building it once.
+
+        static_files: list of (source_path, arcname) tuples
+        """
+        key = self.template_key(static_files)
+        base_path = self.cache_dir / f'base-{key}.zip'
+        if base_path.exists():
+            return base_path
+
+        with self._lock:
+            if base_path.exists():
+                return base_path
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            fd, tmp_name = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            os.close(fd)
+            try:
+                with zipfile.ZipFile(tmp_name, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                    for source, arcname in static_files:
+                        zipf.write(source, arcname)
+                os.replace(tmp_name, base_path)
+            except Exception:
+                os.unlink(tmp_name)
+                raise
+        return base_path
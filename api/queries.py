@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Route Queries
+SQL run by the admin API routes. It lives here, importable without Flask,
+so `migrations.py --check` plans exactly the statements the routes execute.
+Queries owned by the other modules (sweeper, warm pool, stats, ...) are
+module-level constants in those modules and are checked the same way.
+"""
+
+# Free a code whose old row has passed its expiry (insert_support_code)
+RETIRE_EXPIRED_CODE_SQL = '''
+    UPDATE support_codes SET status = 'expired'
+    WHERE code = ? AND status IN ('active', 'pooled') AND expires_at <= datetime('now')
+'''
+
+# A support code customers can still use
+LIVE_CODE_SQL = '''
+    SELECT id, customer_name, customer_email, customer_phone, session_notes, expires_at
+    FROM support_codes
+    WHERE code = ? AND expires_at > datetime('now') AND status = 'active'
+'''
+
+LATEST_CODE_PACKAGE_SQL = '''
+    SELECT id FROM client_packages
+    WHERE support_code = ?
+    ORDER BY created_at DESC
+    LIMIT 1
+'''
+
+# Device, online flag and permanent password in one query (initiate_connection)
+DEVICE_CONNECTION_SQL = '''
+    SELECT d.customer_name, d.device_name,
+           IFNULL(d.last_seen, '') > datetime('now', '-5 minutes') as is_online,
+           sc.code
+    FROM devices d
+    LEFT JOIN support_codes sc ON sc.code = d.support_code
+    WHERE d.id = ?
+    LIMIT 1
+'''
+
+# GET /api/devices: one keyset page, newest last_seen first. {where} is built
+# from the filters below, joined with AND.
+DEVICE_PAGE_SQL = '''
+    SELECT id, customer_name, device_name, os, last_seen, created_at,
+           CASE
+               WHEN last_seen > datetime(:now, '-5 minutes') THEN 'online'
+               WHEN last_seen > datetime(:now, '-1 hour') THEN 'recent'
+               ELSE 'offline'
+           END as status
+    FROM devices
+    {where}
+    ORDER BY last_seen DESC, id DESC
+    LIMIT :limit
+'''
+
+DEVICE_STATUS_FILTERS = {
+    'online': "last_seen > datetime(:now, '-5 minutes')",
+    'recent': "last_seen > datetime(:now, '-1 hour') AND last_seen <= datetime(:now, '-5 minutes')",
+    'offline': "last_seen <= datetime(:now, '-1 hour')"
+}
+DEVICE_CUSTOMER_FILTER = 'customer_name = :customer'
+DEVICE_OS_FILTER = 'os = :os'
+# Heartbeats after the watermark, plus devices that may have crossed the
+# online -> recent or recent -> offline boundary since then: one range on
+# the (last_seen, id) index. New devices are included, as they are created
+# by a heartbeat.
+DEVICE_SINCE_FILTER = "last_seen > datetime(:since, '-1 hour')"
+DEVICE_CURSOR_FILTER = '(last_seen, id) < (:cursor_seen, :cursor_id)'
+# The first page seeks from above every timestamp, so each page is a range
+# SEARCH on the index rather than a walk from its end
+DEVICE_FIRST_CURSOR = ('9999-12-31 23:59:59', '')
+
+
+def where_clause(conditions):
+    return f"WHERE {' AND '.join(conditions)}" if conditions else ''
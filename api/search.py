@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Search
+Full-text search over customers, devices, support codes and packages. The
+search_index FTS5 table is kept in sync by triggers on the source tables
+(see migration 10), so a search is one ranked MATCH with prefix support and
+never touches the source tables.
+"""
+
+import re
+
+# search_index rowids are id * ROWID_KINDS + offset, so triggers can find a
+# source row's entry by rowid. Devices use their search_device_keys id, as
+# the devices table has no stable integer key (migration 14).
+ROWID_KINDS = 4
+KINDS = ('code', 'package', 'device')
+FIELDS = ('customer_name', 'customer_email', 'customer_phone', 'device_name',
+          'os', 'support_code', 'session_notes')
+MAX_TERMS = 8
+
+# {kinds_filter} is kinds_filter(kinds), or empty for every kind
+SEARCH_SQL = f'''
+    SELECT kind, ref, status, {', '.join(FIELDS)}
+    FROM search_index
+    WHERE search_index MATCH ?{{kinds_filter}}
+    ORDER BY rank LIMIT ?
+'''
+
+
+def kinds_filter(kinds):
+    return f" AND kind IN ({','.join('?' * len(kinds))})" if kinds else ''
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query: every word must match as a prefix"""
+    terms = re.findall(r'\w+', text.lower())[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search(db, text, kinds=None, limit=20):
+    """Return ranked matches for text, best first"""
+    match = build_match_query(text)
+    if not match:
+        return []
+
+    params = [match, *(kinds or ()), limit]
+    results = []
+    for row in db.fetchall(SEARCH_SQL.format(kinds_filter=kinds_filter(kinds)), params):
+        result = {'kind': row[0], 'id': row[1]}
+        if row[2] is not None:
+            result['status'] = row[2]
+        for field, value in zip(FIELDS, row[3:]):
+            if value is not None:
+                result[field] = value
+        results.append(result)
+    return results
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist API Server
+Pre-fork WSGI server for production. The master process runs one-time setup,
+binds the listening socket and forks worker processes; each worker builds
+its own app (connections, caches, background threads) after the fork and
+serves requests on a bounded thread pool. The master restarts workers that
+die. On SIGTERM or SIGINT, workers stop accepting, end long-lived streams,
+let in-flight requests finish, then drain their background queues and exit.
+"""
+
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import BaseWSGIServer
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server that handles requests on a fixed-size thread pool"""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads, fd=None):
+        super().__init__(host, port, app, fd=fd)
+        self._pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+        self._active = 0
+        self._idle = threading.Condition()
+
+    def process_request(self, request, client_address):
+        with self._idle:
+            self._active += 1
+        self._pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._idle:
+                self._active -= 1
+                self._idle.notify_all()
+
+    def drain(self, timeout):
+        """Wait up to timeout seconds for in-flight requests; True if all finished"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._active == 0, timeout)
+
+
+def _run_worker(sock, index, create_app, threads, graceful_timeout, on_stopping, on_exit):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    app = create_app(index)
+    host, port = sock.getsockname()[:2]
+    server = PooledWSGIServer(host, port, app, threads, fd=sock.fileno())
+
+    def handle_term(signum, frame):
+        # shutdown() waits for serve_forever to return, so call it off this thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, handle_term)
+    print(f"Worker {index} (pid {os.getpid()}) serving on {host}:{port} with {threads} threads")
+    try:
+        server.serve_forever()
+    finally:
+        if on_stopping:
+            on_stopping(server)
+        if not server.drain(graceful_timeout):
+            print(f"Worker {index}: requests still running after {graceful_timeout}s")
+        # Only now, so work recorded by the requests that just finished is kept
+        if on_exit:
+            on_exit(server)
+        server.server_close()
+
+
+def serve(create_app, host='0.0.0.0', port=5001, workers=2, threads=16,
+          graceful_timeout=30, on_starting=None, on_stopping=None, on_exit=None):
+    """Run the pre-fork server until SIGTERM or SIGINT.
+
+    create_app: callable(worker_index) returning the WSGI app; runs in each
+        worker after the fork
+    on_starting: optional callable run once in the master before forking
+    on_stopping: optional callable(server) run in each worker once it stops
+        accepting requests, e.g. to end long-lived streams so they can finish
+    on_exit: optional callable(server) run in each worker after in-flight
+        requests finished (or graceful_timeout passed), e.g. to drain queues
+    """
+    if on_starting:
+        on_starting()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    sock.set_inheritable(True)
+
+    children = {}
+    stopping = threading.Event()
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                _run_worker(sock, index, create_app, threads, graceful_timeout,
+                            on_stopping, on_exit)
+            except BaseException as e:
+                print(f"Worker {index} failed: {e}")
+                status = 1
+            finally:
+                os._exit(status)
+        children[pid] = index
+
+    def handle_stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+
+    print(f"ConnectAssist API master (pid {os.getpid()}) starting {workers} workers on {host}:{port}")
+    for index in range(workers):
+        spawn(index)
+
+    try:
+        while not stopping.is_set():
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid and pid in children:
+                index = children.pop(pid)
+                print(f"Worker {index} (pid {pid}) exited with status {status}; restarting")
+                time.sleep(1)
+                spawn(index)
+            else:
+                stopping.wait(0.5)
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        # Leave time for draining, then kill what is left
+        deadline = time.monotonic() + graceful_timeout + 5
+        while children and time.monotonic() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                children.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        sock.close()
+        print("ConnectAssist API stopped")
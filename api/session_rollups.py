@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Session Rollups
+Background aggregator that keeps hourly and daily session statistics in
+session_rollups: sessions, total and max duration, and p50/p95 duration per
+technician, device, connection type and overall. A watermark on
+connection_logs.ended_at tracks which closed sessions have been folded in;
+each run recomputes only the buckets those sessions fall into, so reports
+over months of history read a handful of precomputed rows.
+"""
+
+import math
+import threading
+from datetime import datetime, timedelta
+
+from heartbeats import utc_timestamp
+
+WATERMARK = 'session_rollups'
+GRANULARITIES = {
+    'hour': ('%Y-%m-%d %H:00:00', timedelta(hours=1)),
+    'day': ('%Y-%m-%d 00:00:00', timedelta(days=1))
+}
+DIMENSIONS = {
+    'all': lambda session: '',
+    'technician': lambda session: session['technician_id'] or '',
+    'device': lambda session: session['device_id'],
+    'connection_type': lambda session: session['connection_type'] or ''
+}
+
+CLOSED_SESSIONS_SQL = '''
+    SELECT started_at FROM connection_logs
+    WHERE ended_at > ? AND ended_at <= ?
+'''
+
+# Sessions the sweeper timed out have no real duration and are left out
+BUCKET_SESSIONS_SQL = '''
+    SELECT technician_id, device_id, connection_type, duration
+    FROM connection_logs
+    WHERE started_at >= ? AND started_at < ?
+    AND status NOT IN ('active', 'timeout') AND duration IS NOT NULL
+'''
+
+# {value_filter} is REPORT_VALUE_FILTER when one value is requested
+REPORT_SQL = '''
+    SELECT bucket, value, sessions, total_duration, max_duration,
+           p50_duration, p95_duration
+    FROM session_rollups
+    WHERE granularity = ? AND dimension = ? AND bucket >= ? AND bucket < ?{value_filter}
+    ORDER BY bucket, value
+'''
+REPORT_VALUE_FILTER = ' AND value = ?'
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+class SessionRollups:
+    def __init__(self, database, interval=60, lag=5):
+        """
+        interval: seconds between aggregation runs
+        lag: seconds a closed session must age before it is aggregated, so
+             sessions closed in a transaction still in flight are not skipped
+        """
+        self.db = database
+        self.interval = interval
+        self.lag = lag
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='session-rollups', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def watermark(self):
+        row = self.db.fetchone('SELECT value FROM rollup_watermarks WHERE name = ?', (WATERMARK,))
+        return row[0] if row else ''
+
+    def aggregate(self):
+        """Fold sessions closed since the watermark into the rollups.
+
+        Returns the number of hour buckets recomputed.
+        """
+        with self._run_lock:
+            low = self.watermark()
+            high = utc_timestamp(datetime.utcnow() - timedelta(seconds=self.lag))
+            if high <= low:
+                return 0
+
+            hours = set()
+            days = set()
+            for (started_at,) in self.db.fetchall(CLOSED_SESSIONS_SQL, (low, high)):
+                start = datetime.fromisoformat(started_at)
+                hours.add(start.strftime(GRANULARITIES['hour'][0]))
+                days.add(start.strftime(GRANULARITIES['day'][0]))
+
+            # One short transaction per bucket; rerunning a bucket is harmless
+            for bucket in sorted(hours):
+                self._recompute('hour', bucket)
+            for bucket in sorted(days):
+                self._recompute('day', bucket)
+
+            with self.db.transaction() as cursor:
+                cursor.execute('''
+                    INSERT INTO rollup_watermarks (name, value) VALUES (?, ?)
+                    ON CONFLICT(name) DO UPDATE SET value = excluded.value,
+                                                    updated_at = CURRENT_TIMESTAMP
+                ''', (WATERMARK, high))
+            return len(hours)
+
+    def _recompute(self, granularity, bucket):
+        """Rebuild every dimension of one bucket from the raw connection logs"""
+        end = utc_timestamp(datetime.fromisoformat(bucket) + GRANULARITIES[granularity][1])
+        with self.db.transaction() as cursor:
+            cursor.execute(BUCKET_SESSIONS_SQL, (bucket, end))
+            sessions = [{
+                'technician_id': row[0],
+                'device_id': row[1],
+                'connection_type': row[2],
+                'duration': row[3]
+            } for row in cursor.fetchall()]
+
+            rows = []
+            for dimension, key in DIMENSIONS.items():
+                groups = {}
+                for session in sessions:
+                    groups.setdefault(key(session), []).append(session['duration'])
+                for value, durations in groups.items():
+                    durations.sort()
+                    rows.append((
+                        granularity, dimension, bucket, value, len(durations),
+                        sum(durations), durations[-1],
+                        percentile(durations, 0.50), percentile(durations, 0.95)
+                    ))
+                cursor.execute('''
+                    DELETE FROM session_rollups
+                    WHERE granularity = ? AND dimension = ? AND bucket = ?
+                ''', (granularity, dimension, bucket))
+
+            cursor.executemany('''
+                INSERT INTO session_rollups (granularity, dimension, bucket, value, sessions,
+                                             total_duration, max_duration, p50_duration, p95_duration)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+
+    def report(self, granularity, dimension, since, until, value=None):
+        """Read rollup rows for buckets in [since, until)"""
+        params = [granularity, dimension, since, until]
+        value_filter = ''
+        if value is not None:
+            value_filter = REPORT_VALUE_FILTER
+            params.append(value)
+        sql = REPORT_SQL.format(value_filter=value_filter)
+
+        return [{
+            'bucket': row[0],
+            'value': row[1],
+            'sessions': row[2],
+            'total_duration': row[3],
+            'avg_duration': round(row[3] / row[2]) if row[2] else 0,
+            'max_duration': row[4],
+            'p50_duration': row[5],
+            'p95_duration': row[6]
+        } for row in self.db.fetchall(sql, params)]
+
+    def _run(self):
+        try:
+            while True:
+                try:
+                    self.aggregate()
+                except Exception as e:
+                    print(f"Session rollup failed: {e}")
+                if self._stop.wait(self.interval):
+                    break
+        finally:
+            self.db.release()
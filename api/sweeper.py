@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Expiry Sweeper
+Periodic cleanup that keeps the database and package directories bounded:
+marks lapsed support codes expired, purges old codes, packages and package
+jobs, deletes (or archives) package files nothing references any more, and
+compacts old connection logs into daily rollups. Every step works in small
+batches, each in its own short transaction, so live requests are never held
+up behind a long write lock.
+"""
+
+import fnmatch
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Package files newer than this are never collected, so an archive that was
+# just built is not removed before its client_packages row is written
+FILE_GRACE_PERIOD = timedelta(hours=1)
+
+# Each step selects one batch of ids with these, then updates or deletes them
+EXPIRED_CODES_SQL = '''
+    SELECT id, code FROM support_codes
+    WHERE status = 'active' AND expires_at <= datetime('now')
+    LIMIT ?
+'''
+
+STALE_SESSIONS_SQL = '''
+    SELECT id FROM connection_logs
+    WHERE started_at < ? AND status = 'active'
+    LIMIT ?
+'''
+
+PURGEABLE_CODES_SQL = '''
+    SELECT id FROM support_codes sc
+    WHERE status = 'expired' AND expires_at < ?
+    AND NOT EXISTS (SELECT 1 FROM devices d WHERE d.support_code = sc.code)
+    LIMIT ?
+'''
+
+PURGEABLE_PACKAGES_SQL = '''
+    SELECT id FROM client_packages cp
+    WHERE created_at < ?
+    AND NOT EXISTS (
+        SELECT 1 FROM support_codes sc
+        WHERE sc.code = cp.support_code AND sc.status IN ('active', 'pooled')
+    )
+    LIMIT ?
+'''
+
+PURGEABLE_JOBS_SQL = '''
+    SELECT id FROM package_jobs
+    WHERE updated_at < ? AND status IN ('ready', 'failed')
+    LIMIT ?
+'''
+
+OLD_DOWNLOAD_EVENTS_SQL = '''
+    SELECT id FROM download_events
+    WHERE downloaded_at < ?
+    LIMIT ?
+'''
+
+OLD_ACTIVITY_SQL = '''
+    SELECT id FROM activity_events
+    WHERE created_at < ?
+    LIMIT ?
+'''
+
+COMPACTABLE_LOGS_SQL = '''
+    SELECT id FROM connection_logs
+    WHERE started_at < ? AND status != 'active'
+    LIMIT ?
+'''
+
+# Whether a package file is still referenced, by its stored or absolute path
+PACKAGE_FILE_REFERENCED_SQL = '''
+    SELECT 1 FROM client_packages WHERE package_path IN (?, ?) LIMIT 1
+'''
+
+
+def sqlite_timestamp(value):
+    """Format a UTC datetime the way SQLite's datetime('now') does"""
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ExpirySweeper:
+    def __init__(self, database, package_dirs, archive_dir=None, interval=300,
+                 batch_size=500, batch_pause=0.05, code_retention=timedelta(days=30),
+                 package_retention=timedelta(days=7), log_retention=timedelta(days=90),
+                 event_retention=timedelta(days=90), max_session_age=timedelta(hours=12),
+                 caches=(), keep_files=None, on_expire=None, on_sweep=None):
+        """
+        package_dirs: (directory, pattern) pairs naming the package files the
+            API writes there (downloads, base archives); nothing else in
+            those directories is touched, including temp files still being
+            written under other names
+        caches: file caches that track their own use, each with a
+            collect(max_idle) method returning (files, bytes) removed
+        archive_dir: move collected package files here instead of deleting them
+        interval: seconds between sweeps
+        batch_size: rows touched per transaction
+        batch_pause: seconds to yield the write lock between batches
+        keep_files: optional callable returning paths that must never be
+            collected (the current base archive); if it raises, no package
+            files are collected in that sweep
+        on_expire: optional callable(codes) run with the support codes each
+            sweep expired, once they are committed
+        on_sweep: optional callable(report) run after each sweep
+        """
+        self.db = database
+        self.package_dirs = [(str(path), pattern) for path, pattern in package_dirs]
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.code_retention = code_retention
+        self.package_retention = package_retention
+        self.log_retention = log_retention
+        self.event_retention = event_retention
+        self.max_session_age = max_session_age
+        self.caches = list(caches)
+        self.keep_files = keep_files
+        self.on_expire = on_expire
+        self.on_sweep = on_sweep
+        self.last_report = None
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='expiry-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _batches(self, step):
+        """Run step(cursor) in separate transactions until it touches nothing"""
+        total = 0
+        while not self._stop.is_set():
+            with self.db.transaction() as cursor:
+                count = step(cursor)
+            total += count
+            if count < self.batch_size:
+                break
+            time.sleep(self.batch_pause)
+        return total
+
+    def _select_ids(self, cursor, sql, params=()):
+        cursor.execute(sql, params + (self.batch_size,))
+        return [row[0] for row in cursor.fetchall()]
+
+    def _delete_ids(self, cursor, table, ids):
+        placeholders = ','.join('?' * len(ids))
+        cursor.execute(f'DELETE FROM {table} WHERE id IN ({placeholders})', ids)
+
+    # Steps
+
+    def expire_codes(self):
+        """Mark active codes past their expiry as expired"""
+        expired = []
+
+        def step(cursor):
+            cursor.execute(EXPIRED_CODES_SQL, (self.batch_size,))
+            rows = cursor.fetchall()
+            if rows:
+                placeholders = ','.join('?' * len(rows))
+                cursor.execute(f'''
+                    UPDATE support_codes SET status = 'expired'
+                    WHERE id IN ({placeholders})
+                ''', [row[0] for row in rows])
+                expired.extend(row[1] for row in rows)
+            return len(rows)
+
+        total = self._batches(step)
+        if expired and self.on_expire:
+            self.on_expire(expired)
+        return total
+
+    def close_stale_sessions(self):
+        """Time out sessions that were never closed through the API"""
+        cutoff = sqlite_timestamp(datetime.utcnow() - self.max_session_age)
+
+        def step(cursor):
+            ids = self._select_ids(cursor, STALE_SESSIONS_SQL, (cutoff,))
+            if ids:
+                placeholders = ','.join('?' * len(ids))
+                cursor.execute(f'''
+                    UPDATE connection_logs
+                    SET status = 'timeout',
+                        ended_at = datetime('now'),
+                        duration = CAST(ROUND((julianday('now') - julianday(started_at)) * 86400) AS INTEGER)
+                    WHERE id IN ({placeholders})
+                ''', ids)
+            return len(ids)
+        return self._batches(step)
+
+    def purge_codes(self):
+        """Delete long-expired codes that no installed device still refers to"""
+        cutoff = (datetime.now() - self.code_retention).isoformat()
+
+        def step(cursor):
+            ids = self._select_ids(cursor, PURGEABLE_CODES_SQL, (cutoff,))
+            if ids:
+                self._delete_ids(cursor, 'support_codes', ids)
+            return len(ids)
+        return self._batches(step)
+
+    def purge_packages(self):
+        """Delete package records whose support code is no longer live"""
+        cutoff = sqlite_timestamp(datetime.utcnow() - self.package_retention)
+
+        def step(cursor):
+            ids = self._select_ids(cursor, PURGEABLE_PACKAGES_SQL, (cutoff,))
+            if ids:
+                self._delete_ids(cursor, 'client_packages', ids)
+            return len(ids)
+        return self._batches(step)
+
+    def purge_jobs(self):
+        """Delete finished package jobs past the package retention"""
+        cutoff = sqlite_timestamp(datetime.utcnow() - self.package_retention)
+
+        def step(cursor):
+            ids = self._select_ids(cursor, PURGEABLE_JOBS_SQL, (cutoff,))
+            if ids:
+                self._delete_ids(cursor, 'package_jobs', ids)
+            return len(ids)
+        return self._batches(step)
+
+    def purge_download_events(self):
+        """Delete download history past its retention"""
+        cutoff = sqlite_timestamp(datetime.utcnow() - self.event_retention)
+
+        def step(cursor):
+            ids = self._select_ids(cursor, OLD_DOWNLOAD_EVENTS_SQL, (cutoff,))
+            if ids:
+                self._delete_ids(cursor, 'download_events', ids)
+            return len(ids)
+        return self._batches(step)
+
+    def purge_activity(self):
+        """Delete activity feed events past the event retention"""
+        cutoff = sqlite_timestamp(datetime.utcnow() - self.event_retention)
+
+        def step(cursor):
+            ids = self._select_ids(cursor, OLD_ACTIVITY_SQL, (cutoff,))
+            if ids:
+                self._delete_ids(cursor, 'activity_events', ids)
+            return len(ids)
+        return self._batches(step)
+
+    def compact_logs(self):
+        """Fold closed connection logs past retention into daily rollups"""
+        cutoff = sqlite_timestamp(datetime.utcnow() - self.log_retention)
+
+        def step(cursor):
+            ids = self._select_ids(cursor, COMPACTABLE_LOGS_SQL, (cutoff,))
+            if not ids:
+                return 0
+            placeholders = ','.join('?' * len(ids))
+            cursor.execute(f'''
+                INSERT INTO connection_log_rollups (day, device_id, technician_id, connection_type,
+                                                    sessions, total_duration, max_duration)
+                SELECT date(started_at), device_id, IFNULL(technician_id, ''),
+                       IFNULL(connection_type, ''), COUNT(*), SUM(IFNULL(duration, 0)),
+                       MAX(IFNULL(duration, 0))
+                FROM connection_logs
+                WHERE id IN ({placeholders})
+                GROUP BY 1, 2, 3, 4
+                ON CONFLICT(day, device_id, technician_id, connection_type) DO UPDATE SET
+                    sessions = sessions + excluded.sessions,
+                    total_duration = total_duration + excluded.total_duration,
+                    max_duration = MAX(max_duration, excluded.max_duration)
+            ''', ids)
+            self._delete_ids(cursor, 'connection_logs', ids)
+            return len(ids)
+        return self._batches(step)
+
+    def collect_files(self):
+        """Remove package files that no client_packages row references.
+
+        Returns (files, bytes) reclaimed.
+        """
+        files = reclaimed = 0
+        for cache in self.caches:
+            collected, size = cache.collect(FILE_GRACE_PERIOD.total_seconds())
+            files += collected
+            reclaimed += size
+
+        try:
+            keep = {os.path.abspath(path) for path in (self.keep_files() if self.keep_files else ())}
+        except Exception as e:
+            print(f"Skipping package file collection, current packages unknown: {e}")
+            return files, reclaimed
+        cutoff = time.time() - FILE_GRACE_PERIOD.total_seconds()
+
+        for directory, pattern in self.package_dirs:
+            if not os.path.isdir(directory):
+                continue
+            for entry in os.scandir(directory):
+                if not entry.is_file() or not fnmatch.fnmatchcase(entry.name, pattern):
+                    continue
+                path = os.path.abspath(entry.path)
+                stat = entry.stat()
+                if path in keep or stat.st_mtime > cutoff:
+                    continue
+                # Per-file index lookup; only a few files are old enough to check
+                if self.db.fetchone(PACKAGE_FILE_REFERENCED_SQL, (entry.path, path)):
+                    continue
+                try:
+                    if self.archive_dir:
+                        os.makedirs(self.archive_dir, exist_ok=True)
+                        shutil.move(path, os.path.join(self.archive_dir, entry.name))
+                    else:
+                        os.unlink(path)
+                except OSError as e:
+                    print(f"Could not collect package file {path}: {e}")
+                    continue
+                files += 1
+                reclaimed += stat.st_size
+        return files, reclaimed
+
+    def sweep(self):
+        """Run every cleanup step once and return a report of what was reclaimed"""
+        with self._run_lock:
+            started = time.monotonic()
+            report = {
+                'codes_expired': self.expire_codes(),
+                'codes_purged': self.purge_codes(),
+                'sessions_timed_out': self.close_stale_sessions(),
+                'packages_purged': self.purge_packages(),
+                'jobs_purged': self.purge_jobs(),
+                'download_events_purged': self.purge_download_events(),
+                'activity_purged': self.purge_activity(),
+                'logs_compacted': self.compact_logs()
+            }
+            report['files_removed'], report['bytes_reclaimed'] = self.collect_files()
+            report['finished_at'] = datetime.now().isoformat()
+            report['duration_ms'] = int((time.monotonic() - started) * 1000)
+            self.last_report = report
+
+        if self.on_sweep:
+            self.on_sweep(report)
+        return report
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f"Expiry sweep failed: {e}")
+        finally:
+            self.db.release()
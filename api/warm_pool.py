@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Warm Pool
+Keeps a stock of pre-allocated support codes (status 'pooled') whose package
+base archive is already built. Claiming one binds the customer details and
+records the package in a single short transaction, so a technician gets a
+ready code and download link without waiting for allocation or package prep.
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+POOLED_COUNT_SQL = '''
+    SELECT COUNT(*) FROM support_codes
+    WHERE status = 'pooled' AND expires_at > datetime('now')
+'''
+
+# Oldest pooled code first, so codes are used before they lapse
+CLAIM_POOLED_SQL = '''
+    SELECT id, code FROM support_codes
+    WHERE status = 'pooled' AND expires_at > datetime('now')
+    ORDER BY expires_at
+    LIMIT 1
+'''
+
+
+class WarmPool:
+    def __init__(self, database, admin, size=50, low_water=20,
+                 ttl=timedelta(hours=24), check_interval=30):
+        """
+        admin: AdminAPI instance (code allocation and package recording)
+        size: number of codes the pool is topped up to
+        low_water: refill once fewer than this many codes are pooled
+        ttl: how long an unclaimed code stays in the pool
+        """
+        self.db = database
+        self.admin = admin
+        self.size = size
+        self.low_water = low_water
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and self.size > 0:
+            self._thread = threading.Thread(target=self._run, name='warm-pool', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def available(self):
+        return self.db.fetchone(POOLED_COUNT_SQL)[0]
+
+    def expire(self):
+        """Retire pooled codes that were never claimed"""
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                SELECT code FROM support_codes
+                WHERE status = 'pooled' AND expires_at <= datetime('now')
+            ''')
+            codes = [row[0] for row in cursor.fetchall()]
+            cursor.execute('''
+                UPDATE support_codes SET status = 'expired'
+                WHERE status = 'pooled' AND expires_at <= datetime('now')
+            ''')
+        for code in codes:
+            self.admin.code_allocator.release(code)
+        return len(codes)
+
+    def refill(self):
+        """Top the pool up to size once it falls below the low-water mark"""
+        self.expire()
+        missing = self.size - self.available()
+        if missing <= 0 or self.size - missing >= self.low_water:
+            return 0
+
+        # Build the shared base archive (and fetch the binary) ahead of claims
+        self.admin.prepare_package_base()
+
+        expires_at = datetime.now() + self.ttl
+        with self.db.transaction() as cursor:
+            for _ in range(missing):
+                self.admin.insert_support_code(cursor, {}, expires_at, status='pooled')
+        return missing
+
+    def claim(self, customer_data, expires_at):
+        """Bind a pooled code to a customer. Returns the code, or None if empty."""
+        if self.size <= 0:
+            return None
+        try:
+            # Normally a memoized lookup; never fetch inside the write transaction
+            base_path = self.admin.prepare_package_base()
+        except Exception as e:
+            print(f"Warm pool claim skipped: {e}")
+            return None
+
+        with self.db.transaction() as cursor:
+            cursor.execute(CLAIM_POOLED_SQL)
+            row = cursor.fetchone()
+            if not row:
+                self._wake.set()
+                return None
+
+            pool_id, code = row
+            cursor.execute('''
+                UPDATE support_codes
+                SET status = 'active', expires_at = ?, created_at = datetime('now'),
+                    customer_name = ?, customer_email = ?, customer_phone = ?, session_notes = ?
+                WHERE id = ?
+            ''', (
+                expires_at.isoformat(),
+                customer_data.get('customer_name'),
+                customer_data.get('customer_email'),
+                customer_data.get('customer_phone'),
+                customer_data.get('session_notes'),
+                pool_id
+            ))
+            self.admin.record_client_package(cursor, code, customer_data, base_path)
+
+        self.admin.code_allocator.extend(code, expires_at)
+        self._wake.set()
+        return code
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.refill()
+                except Exception as e:
+                    print(f"Warm pool refill failed: {e}")
+                self._wake.wait(self.check_interval)
+                self._wake.clear()
+        finally:
+            self.db.release()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+ConnectAssist Artifact Fetcher
+Downloads build artifacts (e.g. the RustDesk Windows binary) into a local cache.
+Only one download runs per artifact while other callers wait for it, partial
+downloads are resumed, and files are checksum-verified before being atomically
+renamed into place. Artifacts without a pinned sha256 are refused.
+"""
+
+import hashlib
+import http.client
+import json
+import os
+import shutil
+import threading
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows build hosts
+    fcntl = None
+
+DEFAULT_ARTIFACTS = {
+    "rustdesk-windows": {
+        "url": "https://github.com/rustdesk/rustdesk/releases/download/1.2.3/rustdesk-1.2.3-x86_64.exe",
+        "filename": "rustdesk-windows.exe",
+        "sha256": ""
+    }
+}
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class ArtifactFetchError(Exception):
+    pass
+
+
+def load_artifact_config(config_path):
+    """Read the artifact specs and mirror directory from builder-config.json"""
+    artifacts = {name: dict(spec) for name, spec in DEFAULT_ARTIFACTS.items()}
+    mirror_dir = None
+    if config_path and os.path.exists(config_path):
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+        for name, spec in config.get('artifacts', {}).items():
+            artifacts.setdefault(name, {}).update(spec)
+        mirror_dir = config.get('artifact_mirror') or None
+    return artifacts, mirror_dir
+
+
+def sha256_file(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class ArtifactFetcher:
+    def __init__(self, cache_dir, artifacts=None, mirror_dir=None, timeout=60):
+        self.cache_dir = Path(cache_dir)
+        self.artifacts = artifacts or DEFAULT_ARTIFACTS
+        self.mirror_dir = Path(mirror_dir) if mirror_dir else None
+        self.timeout = timeout
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._verified = {}
+
+    def check_pins(self):
+        """Raise ArtifactFetchError naming every artifact without a pinned sha256.
+
+        Services that build packages call this at startup, so a missing pin
+        stops them once with a clear message instead of failing every request.
+        """
+        unpinned = [name for name, spec in self.artifacts.items() if not spec.get('sha256')]
+        if unpinned:
+            raise ArtifactFetchError(
+                f"Pin {', '.join(f'artifacts.{name}.sha256' for name in unpinned)} in "
+                f"builder-config.json to the published digest of the release binary"
+            )
+
+    def path_for(self, name):
+        return self.cache_dir / self.artifacts[name]['filename']
+
+    @contextmanager
+    def _single_flight(self, name):
+        """Hold the per-artifact lock across threads and worker processes"""
+        with self._locks_guard:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.cache_dir / f'.{name}.lock', 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _is_valid(self, path, expected):
+        """Check a cached file against its pinned checksum (memoized on size/mtime)"""
+        if not path.exists():
+            return False
+        stat = path.stat()
+        memo_key = (str(path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in self._verified:
+            self._verified[memo_key] = sha256_file(path) == expected.lower()
+        return self._verified[memo_key]
+
+    def fetch(self, name):
+        """Return the cached path of an artifact, downloading it if needed"""
+        spec = self.artifacts[name]
+        dest = self.path_for(name)
+        expected = spec.get('sha256', '')
+        if not expected:
+            raise ArtifactFetchError(
+                f"No sha256 pinned for {name}; set artifacts.{name}.sha256 in "
+                f"builder-config.json to the published digest of {spec['url']}"
+            )
+
+        if self._is_valid(dest, expected):
+            return dest
+
+        with self._single_flight(name):
+            # Another caller may have finished the download while we waited
+            if self._is_valid(dest, expected):
+                return dest
+            if dest.exists():
+                print(f"⚠️ Cached {dest.name} failed checksum verification, refetching")
+
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            partial = dest.with_name(dest.name + '.part')
+
+            mirror_file = self.mirror_dir / spec['filename'] if self.mirror_dir else None
+            if mirror_file and mirror_file.exists():
+                try:
+                    shutil.copyfile(mirror_file, partial)
+                except OSError as e:
+                    raise ArtifactFetchError(f"Copy of {mirror_file} failed: {e}") from e
+            else:
+                self._download(spec['url'], partial)
+
+            actual = sha256_file(partial)
+            if actual != expected.lower():
+                partial.unlink()
+                raise ArtifactFetchError(
+                    f"Checksum mismatch for {name}: expected {expected}, got {actual}"
+                )
+
+            os.replace(partial, dest)
+            return dest
+
+    def _download(self, url, partial):
+        """Download url into partial, resuming from any bytes already there.
+
+        Any failure, including a reset or timeout partway through, raises
+        ArtifactFetchError; the bytes received so far are kept for the next
+        attempt to resume from.
+        """
+        offset = partial.stat().st_size if partial.exists() else 0
+        req = urllib.request.Request(url)
+        if offset:
+            req.add_header('Range', f'bytes={offset}-')
+
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                mode = 'ab' if offset and response.status == 206 else 'wb'
+                with open(partial, mode) as f:
+                    shutil.copyfileobj(response, f, CHUNK_SIZE)
+                    received = f.tell() - (offset if mode == 'ab' else 0)
+                length = response.headers.get('Content-Length')
+                # A dropped connection reads as a short body, not an error
+                if length is not None and received < int(length):
+                    raise ArtifactFetchError(
+                        f"Download of {url} was cut off after {received} of {length} bytes"
+                    )
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and offset:
+                # Partial file is already complete (or stale); verification decides
+                return
+            raise ArtifactFetchError(f"Download of {url} failed: {e}") from e
+        except (OSError, http.client.HTTPException) as e:
+            raise ArtifactFetchError(f"Download of {url} failed: {e}") from e
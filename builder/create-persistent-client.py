@@ -10,27 +10,22 @@ import json
 import shutil
 import zipfile
 import tempfile
-import urllib.request
 from pathlib import Path
 
+from artifact_fetch import ArtifactFetcher, ArtifactFetchError, load_artifact_config
+
 def download_rustdesk_binary():
-    """Download the latest RustDesk Windows binary"""
-    print("📥 Downloading RustDesk Windows binary...")
-    
-    # RustDesk GitHub releases URL (use a working version)
-    download_url = "https://github.com/rustdesk/rustdesk/releases/download/1.2.3/rustdesk-1.2.3-x86_64.exe"
+    """Download the RustDesk Windows binary (or verify the cached copy)"""
+    print("📥 Fetching RustDesk Windows binary...")
     
-    # Create downloads directory
-    downloads_dir = Path("downloads")
-    downloads_dir.mkdir(exist_ok=True)
-    
-    binary_path = downloads_dir / "rustdesk-windows.exe"
+    artifacts, mirror_dir = load_artifact_config("builder-config.json")
+    fetcher = ArtifactFetcher(Path("downloads"), artifacts, mirror_dir)
     
     try:
-        urllib.request.urlretrieve(download_url, binary_path)
-        print(f"✅ Downloaded: {binary_path}")
+        binary_path = fetcher.fetch("rustdesk-windows")
+        print(f"✅ RustDesk binary ready: {binary_path}")
         return binary_path
-    except Exception as e:
+    except ArtifactFetchError as e:
         print(f"❌ Download failed: {e}")
         return None
 
@@ -53,12 +48,10 @@ def create_persistent_client_package(support_code=None, customer_info=None):
         shutil.rmtree(output_dir)
     output_dir.mkdir(parents=True)
     
-    # Download RustDesk binary if not exists
-    binary_path = Path("downloads/rustdesk-windows.exe")
-    if not binary_path.exists():
-        binary_path = download_rustdesk_binary()
-        if not binary_path:
-            return None
+    # Download RustDesk binary if not cached and verified
+    binary_path = download_rustdesk_binary()
+    if not binary_path:
+        return None
     
     # Copy RustDesk binary to output
     client_exe = output_dir / "connectassist-windows.exe"
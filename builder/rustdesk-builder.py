@@ -1,17 +1,27 @@
 #!/usr/bin/env python3
 """
 ConnectAssist RustDesk Client Builder
-Builds custom RustDesk clients preconfigured for ConnectAssist server
+Builds custom RustDesk clients preconfigured for ConnectAssist server.
+Built binaries are cached by (RustDesk commit, patched config hash, target,
+features, toolchain), so a run with nothing changed copies the stored
+artifacts instead of invoking cargo, and cargo's target directory lives
+outside the source tree so dependencies are only compiled once. Targets are
+compiled at the same time in separate target directories, sharing a job
+budget, and installer packaging overlaps with the compiles still running.
 """
 
 import os
 import sys
 import json
+import time
 import shutil
+import hashlib
 import subprocess
 import argparse
 import tempfile
+import threading
 import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Dict, List, Optional
 
@@ -24,6 +34,22 @@ class RustDeskBuilder:
         self.api_server = f"https://{self.domain}"
         self.build_dir = Path(config.get('build_dir', './build'))
         self.output_dir = Path(config.get('output_dir', '../www/downloads'))
+        # Persistent cargo target directory and binary cache
+        self.target_dir = Path(config.get('target_dir') or self.build_dir / 'target')
+        self.cache_dir = Path(config.get('build_cache_dir') or self.build_dir / 'cache')
+        self.cache_keep = config.get('build_cache_keep', 10)
+        self.use_cache = config.get('build_cache', True)
+        # Compiler cache used as RUSTC_WRAPPER, e.g. "sccache"
+        self.compiler_cache = config.get('compiler_cache', '')
+        # Parallel builds: total cargo jobs, split across targets compiled at once
+        self.build_jobs = config.get('build_jobs') or os.cpu_count() or 1
+        self.parallel_targets = config.get('parallel_targets', 2)
+        self.cargo_timings = config.get('cargo_timings', False)
+        self.log_dir = Path(config.get('log_dir') or self.build_dir / 'logs')
+        self._print_lock = threading.Lock()
+        # Set once the source is checked out and patched
+        self.source_commit = None
+        self.config_hash = None
         
     def setup_build_environment(self):
         """Setup the build environment"""
@@ -39,6 +65,10 @@ class RustDeskBuilder:
             if not shutil.which(tool):
                 raise RuntimeError(f"Required tool '{tool}' not found in PATH")
         
+        if self.compiler_cache and not shutil.which(self.compiler_cache):
+            print(f"⚠️ Compiler cache '{self.compiler_cache}' not found, building without it")
+            self.compiler_cache = ''
+        
         print("✅ Build environment ready")
     
     def clone_rustdesk_source(self):
@@ -47,7 +77,15 @@ class RustDeskBuilder:
         
         if rustdesk_dir.exists():
             print("📁 RustDesk source already exists, updating...")
-            subprocess.run(['git', 'pull'], cwd=rustdesk_dir, check=True)
+            subprocess.run(['git', 'fetch'], cwd=rustdesk_dir, check=True)
+            if self._git(rustdesk_dir, 'rev-parse', 'HEAD') != self._git(rustdesk_dir, 'rev-parse', '@{u}'):
+                # Drop our patches so the update applies cleanly; they are
+                # reapplied by create_custom_config
+                subprocess.run(['git', 'checkout', '--', 'src/config.rs'], cwd=rustdesk_dir, check=True)
+                subprocess.run(['git', 'pull'], cwd=rustdesk_dir, check=True)
+            else:
+                # Leave the tree (and file mtimes) alone so cargo has nothing to redo
+                print("✅ RustDesk source is up to date")
         else:
             print("📥 Cloning RustDesk source...")
             subprocess.run([
@@ -56,8 +94,15 @@ class RustDeskBuilder:
                 str(rustdesk_dir)
             ], check=True)
         
+        self.source_commit = self._git(rustdesk_dir, 'rev-parse', 'HEAD')
         return rustdesk_dir
     
+    def _git(self, repo_dir: Path, *args) -> str:
+        """Run a git command and return its trimmed output"""
+        result = subprocess.run(['git', *args], cwd=repo_dir, check=True,
+                                capture_output=True, text=True)
+        return result.stdout.strip()
+    
     def create_custom_config(self, rustdesk_dir: Path):
         """Create custom configuration for ConnectAssist"""
         print("⚙️ Creating custom configuration...")
@@ -79,20 +124,37 @@ class RustDeskBuilder:
         
         # Write config to source
         config_file = rustdesk_dir / 'src' / 'config.rs'
-        self._patch_config_file(config_file, config_content)
+        patched = self._patch_config_file(config_file, config_content)
+        
+        # Everything that shapes the binary besides the source revision
+        config_hash = hashlib.sha256(json.dumps(config_content, sort_keys=True).encode('utf-8'))
+        config_hash.update(patched.encode('utf-8'))
+        self.config_hash = config_hash.hexdigest()
         
         # Create branding files
         self._create_branding_files(rustdesk_dir)
     
     def _patch_config_file(self, config_file: Path, config: Dict):
-        """Patch the RustDesk config file with custom settings"""
+        """Patch the RustDesk config file with custom settings.
+        
+        Returns the patched content. The file is only rewritten when the
+        content changes, so an unchanged config does not make cargo rebuild.
+        """
         if not config_file.exists():
             print(f"⚠️ Config file not found: {config_file}")
-            return
+            return ''
         
-        # Read original config
+        # Read current config
         with open(config_file, 'r') as f:
-            content = f.read()
+            original = f.read()
+        
+        # Patch the committed file rather than an earlier run's output, so a
+        # changed setting replaces the value patched in last time
+        try:
+            content = subprocess.run(['git', 'show', 'HEAD:src/config.rs'], cwd=config_file.parent.parent,
+                                     check=True, capture_output=True, text=True).stdout
+        except (subprocess.CalledProcessError, OSError):
+            content = original
         
         # Apply patches for custom server settings
         patches = [
@@ -114,10 +176,13 @@ class RustDeskBuilder:
                 content = content.replace(old, new)
         
         # Write patched config
-        with open(config_file, 'w') as f:
-            f.write(content)
-        
-        print("✅ Configuration patched")
+        if content != original:
+            with open(config_file, 'w') as f:
+                f.write(content)
+            print("✅ Configuration patched")
+        else:
+            print("✅ Configuration already patched")
+        return content
     
     def _create_branding_files(self, rustdesk_dir: Path):
         """Create custom branding files"""
@@ -132,30 +197,21 @@ class RustDeskBuilder:
         
         print("✅ Branding files ready")
     
-    def build_windows_client(self, rustdesk_dir: Path):
+    def build_windows_client(self, rustdesk_dir: Path, jobs: Optional[int] = None):
         """Build Windows client"""
         print("🏗️ Building Windows client...")
         
         # Set environment for Windows cross-compilation
-        env = os.environ.copy()
-        env['CARGO_TARGET_X86_64_PC_WINDOWS_GNU_LINKER'] = 'x86_64-w64-mingw32-gcc'
-        
-        # Build command
-        build_cmd = [
-            'cargo', 'build', 
-            '--release',
-            '--target', 'x86_64-pc-windows-gnu',
-            '--features', 'inline'
-        ]
+        env = {'CARGO_TARGET_X86_64_PC_WINDOWS_GNU_LINKER': 'x86_64-w64-mingw32-gcc'}
         
         try:
-            subprocess.run(build_cmd, cwd=rustdesk_dir, env=env, check=True)
+            exe_source = self.cargo_build(rustdesk_dir, 'x86_64-pc-windows-gnu', 'inline',
+                                          'rustdesk.exe', env=env, label='windows', jobs=jobs)
             
             # Copy built executable
-            exe_source = rustdesk_dir / 'target' / 'x86_64-pc-windows-gnu' / 'release' / 'rustdesk.exe'
             exe_dest = self.output_dir / 'connectassist-windows.exe'
             
-            if exe_source.exists():
+            if exe_source:
                 shutil.copy2(exe_source, exe_dest)
                 print(f"✅ Windows client built: {exe_dest}")
                 return exe_dest
@@ -167,25 +223,18 @@ class RustDeskBuilder:
             print(f"❌ Windows build failed: {e}")
             return None
     
-    def build_linux_client(self, rustdesk_dir: Path):
+    def build_linux_client(self, rustdesk_dir: Path, jobs: Optional[int] = None):
         """Build Linux client"""
         print("🏗️ Building Linux client...")
         
-        # Build command
-        build_cmd = [
-            'cargo', 'build', 
-            '--release',
-            '--features', 'inline'
-        ]
-        
         try:
-            subprocess.run(build_cmd, cwd=rustdesk_dir, check=True)
+            exe_source = self.cargo_build(rustdesk_dir, None, 'inline', 'rustdesk',
+                                          label='linux', jobs=jobs)
             
             # Copy built executable
-            exe_source = rustdesk_dir / 'target' / 'release' / 'rustdesk'
             exe_dest = self.output_dir / 'connectassist-linux'
             
-            if exe_source.exists():
+            if exe_source:
                 shutil.copy2(exe_source, exe_dest)
                 
                 # Create AppImage (simplified version)
@@ -203,7 +252,110 @@ class RustDeskBuilder:
             print(f"❌ Linux build failed: {e}")
             return None
     
-    def create_installer_wrapper(self, executable_path: Path):
+    def host_triple(self) -> str:
+        """Target triple cargo builds for when no --target is given"""
+        for line in subprocess.run(['rustc', '-vV'], check=True, capture_output=True,
+                                   text=True).stdout.splitlines():
+            if line.startswith('host:'):
+                return line.split(':', 1)[1].strip()
+        return 'host'
+    
+    def cache_key(self, triple: str, features: str) -> str:
+        """Build cache key: source commit, patched config, target, features and toolchain"""
+        toolchain = subprocess.run(['rustc', '-V'], check=True, capture_output=True,
+                                   text=True).stdout.strip()
+        key = json.dumps([self.source_commit, self.config_hash, triple, features, toolchain])
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+    
+    def cargo_build(self, rustdesk_dir: Path, triple: Optional[str], features: str,
+                    binary_name: str, env: Optional[Dict] = None, label: str = 'build',
+                    jobs: Optional[int] = None) -> Optional[Path]:
+        """Build one target with cargo, or reuse the cached binary from an identical build.
+        
+        Each label gets its own target directory, so targets built at the
+        same time do not wait on each other's cargo lock. Returns the path of
+        the cached binary, or None if cargo produced none. Raises
+        CalledProcessError if cargo fails.
+        """
+        key = self.cache_key(triple or self.host_triple(), features)
+        entry = self.cache_dir / key
+        cached = entry / binary_name
+        if self.use_cache and cached.exists():
+            print(f"♻️ Using cached {binary_name} for {triple or 'host'} ({key[:12]})")
+            os.utime(entry)
+            return cached
+        
+        build_env = os.environ.copy()
+        build_env.update(env or {})
+        target_dir = self.target_dir / label
+        build_env['CARGO_TARGET_DIR'] = str(target_dir.resolve())
+        if self.compiler_cache:
+            build_env['RUSTC_WRAPPER'] = self.compiler_cache
+        
+        build_cmd = ['cargo', 'build', '--release']
+        if triple:
+            build_cmd += ['--target', triple]
+        build_cmd += ['--features', features]
+        if jobs:
+            build_cmd += ['--jobs', str(jobs)]
+        if self.cargo_timings:
+            # HTML report in <target_dir>/cargo-timings/
+            build_cmd.append('--timings')
+        
+        self.run_logged(label, build_cmd, cwd=rustdesk_dir, env=build_env)
+        
+        built = target_dir / (triple or '') / 'release' / binary_name
+        if not built.exists():
+            return None
+        
+        # Store the binary and a manifest, then make the entry visible atomically
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(dir=self.cache_dir, prefix='.staging-'))
+        shutil.copy2(built, staging / binary_name)
+        with open(staging / 'manifest.json', 'w') as f:
+            json.dump({
+                'commit': self.source_commit,
+                'config_hash': self.config_hash,
+                'target': triple or 'host',
+                'features': features,
+                'binary': binary_name,
+                'built_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+            }, f, indent=2)
+        if entry.exists():
+            shutil.rmtree(entry)
+        os.replace(staging, entry)
+        self.prune_cache()
+        return cached
+    
+    def run_logged(self, label: str, cmd: List[str], **kwargs):
+        """Run cmd, streaming its output to the console prefixed with label
+        and to logs/<label>.log with the elapsed time on every line"""
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        started = time.monotonic()
+        with open(self.log_dir / f'{label}.log', 'a') as log:
+            log.write(f"$ {' '.join(cmd)}\n")
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, errors='replace', **kwargs)
+            for line in process.stdout:
+                log.write(f'[{time.monotonic() - started:8.1f}s] {line}')
+                with self._print_lock:
+                    print(f'[{label}] {line}', end='', flush=True)
+            returncode = process.wait()
+            log.write(f'exit status {returncode} after {time.monotonic() - started:.1f}s\n')
+        if returncode:
+            raise subprocess.CalledProcessError(returncode, cmd)
+    
+    def prune_cache(self):
+        """Keep only the most recently used build cache entries"""
+        if not self.cache_dir.exists():
+            return
+        entries = sorted((path for path in self.cache_dir.iterdir()
+                          if path.is_dir() and not path.name.startswith('.')),
+                         key=lambda path: path.stat().st_mtime, reverse=True)
+        for stale in entries[self.cache_keep:]:
+            shutil.rmtree(stale, ignore_errors=True)
+    
+    def create_installer_wrapper(self, executable_path: Path, label: str = 'package'):
         """Create installer wrapper with custom settings"""
         if not executable_path.exists():
             return None
@@ -212,11 +364,11 @@ class RustDeskBuilder:
         
         # For Windows, create NSIS installer script
         if executable_path.suffix == '.exe':
-            return self._create_nsis_installer(executable_path)
+            return self._create_nsis_installer(executable_path, label)
         
         return executable_path
     
-    def _create_nsis_installer(self, exe_path: Path):
+    def _create_nsis_installer(self, exe_path: Path, label: str = 'package'):
         """Create NSIS installer script"""
         nsis_script = f"""
 ; ConnectAssist Installer Script
@@ -273,7 +425,7 @@ SectionEnd
         # Compile NSIS installer if makensis is available
         if shutil.which('makensis'):
             try:
-                subprocess.run(['makensis', str(nsis_file)], check=True)
+                self.run_logged(label, ['makensis', str(nsis_file)])
                 installer_path = self.build_dir / f"{exe_path.stem}-installer.exe"
                 if installer_path.exists():
                     final_path = self.output_dir / f"{exe_path.stem}-installer.exe"
@@ -288,25 +440,60 @@ SectionEnd
     def build_all_clients(self):
         """Build all client versions"""
         print("🚀 Starting ConnectAssist client build process...")
+        started = time.monotonic()
         
         self.setup_build_environment()
         rustdesk_dir = self.clone_rustdesk_source()
         self.create_custom_config(rustdesk_dir)
         
-        built_clients = []
-        
-        # Build Windows client
+        targets = []
         if self.config.get('build_windows', True):
-            windows_client = self.build_windows_client(rustdesk_dir)
-            if windows_client:
-                installer = self.create_installer_wrapper(windows_client)
-                built_clients.append(installer)
-        
-        # Build Linux client
+            targets.append(('windows', self.build_windows_client))
         if self.config.get('build_linux', True):
-            linux_client = self.build_linux_client(rustdesk_dir)
-            if linux_client:
-                built_clients.append(linux_client)
+            targets.append(('linux', self.build_linux_client))
+        if not targets:
+            print("⚠️ No targets enabled")
+            return []
+        
+        # Fresh per-target logs for this run
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        for name, _ in targets:
+            (self.log_dir / f'{name}.log').write_text('')
+        
+        parallel = max(1, min(len(targets), self.parallel_targets))
+        jobs = max(1, self.build_jobs // parallel)
+        print(f"⚙️ Building {len(targets)} target(s), {parallel} at a time with {jobs} cargo jobs each")
+        
+        timings = {name: {} for name, _ in targets}
+        
+        def timed(name, stage, fn, *args):
+            stage_started = time.monotonic()
+            try:
+                return fn(*args)
+            finally:
+                timings[name][stage] = time.monotonic() - stage_started
+        
+        # Compiles run on their own pool; each finished binary is packaged on
+        # a separate worker while the remaining compiles keep going
+        packaged = {}
+        with ThreadPoolExecutor(max_workers=parallel, thread_name_prefix='compile') as compile_pool, \
+             ThreadPoolExecutor(max_workers=1, thread_name_prefix='package') as package_pool:
+            compiles = {compile_pool.submit(timed, name, 'compile', build, rustdesk_dir, jobs): name
+                        for name, build in targets}
+            for future in as_completed(compiles):
+                name = compiles[future]
+                client = future.result()
+                if client:
+                    packaged[name] = package_pool.submit(timed, name, 'package',
+                                                         self.create_installer_wrapper, client, name)
+            built_clients = [packaged[name].result() for name, _ in targets if name in packaged]
+        built_clients = [client for client in built_clients if client]
+        
+        print("⏱️ Build timings:")
+        for name, _ in targets:
+            stages = ', '.join(f"{stage} {seconds:.1f}s" for stage, seconds in timings[name].items())
+            print(f"   {name}: {stages} (log: {self.log_dir / f'{name}.log'})")
+        print(f"   total: {time.monotonic() - started:.1f}s")
         
         print(f"✅ Build process completed. Built {len(built_clients)} clients:")
         for client in built_clients:
@@ -341,6 +528,14 @@ def main():
                        help='Configuration file path')
     parser.add_argument('--output-dir', default='../www/downloads',
                        help='Output directory for built clients')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Rebuild every target even if a cached build matches')
+    parser.add_argument('--compiler-cache', default=None,
+                       help='Compiler cache to use as RUSTC_WRAPPER (e.g. sccache)')
+    parser.add_argument('--jobs', type=int, default=None,
+                       help='Total cargo jobs, split across targets built at once (default: CPU count)')
+    parser.add_argument('--sequential', action='store_true',
+                       help='Compile one target at a time')
     
     args = parser.parse_args()
     
@@ -348,6 +543,14 @@ def main():
     config = load_config(args.config)
     if args.output_dir:
         config['output_dir'] = args.output_dir
+    if args.no_cache:
+        config['build_cache'] = False
+    if args.compiler_cache is not None:
+        config['compiler_cache'] = args.compiler_cache
+    if args.jobs:
+        config['build_jobs'] = args.jobs
+    if args.sequential:
+        config['parallel_targets'] = 1
     
     # Create builder and build clients
     builder = RustDeskBuilder(config)
@@ -77,6 +77,15 @@ cat > /tmp/admin_location.conf << 'EOF'
         proxy_set_header X-Real-IP $remote_addr;
         proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;
         proxy_set_header X-Forwarded-Proto $scheme;
+        proxy_set_header X-Sendfile-Type X-Accel-Redirect;
+        proxy_set_header X-Accel-Mapping /opt/connectassist/data/installers/=/internal/installers/;
+    }
+
+    # Installer files served through X-Accel-Redirect from the API
+    location /internal/installers/ {
+        internal;
+        alias /opt/connectassist/data/installers/;
+        etag on;
     }
 
     # Downloads directory for client packages
@@ -106,6 +115,15 @@ if ! grep -q "location /admin/" /etc/nginx/sites-available/connectassist.live; t
         proxy_set_header X-Real-IP $remote_addr;\
         proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;\
         proxy_set_header X-Forwarded-Proto $scheme;\
+        proxy_set_header X-Sendfile-Type X-Accel-Redirect;\
+        proxy_set_header X-Accel-Mapping /opt/connectassist/data/installers/=/internal/installers/;\
+    }\
+\
+    # Installer files served through X-Accel-Redirect from the API\
+    location /internal/installers/ {\
+        internal;\
+        alias /opt/connectassist/data/installers/;\
+        etag on;\
     }\
 \
     # Downloads directory for client packages\
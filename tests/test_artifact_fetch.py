@@ -0,0 +1,143 @@
+"""Artifact cache (builder/artifact_fetch.py) against a stub HTTP server"""
+
+import hashlib
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'builder'))
+
+from artifact_fetch import ArtifactFetcher, ArtifactFetchError
+
+PAYLOAD = os.urandom(256 * 1024)
+PAYLOAD_SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), StubHandler)
+        self.requests = []
+        self.delay = 0
+        # Bytes sent before dropping the connection on the next full download
+        self.truncate_at = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/rustdesk.exe'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(self.headers.get('Range'))
+        time.sleep(server.delay)
+
+        start = 0
+        if self.headers.get('Range'):
+            start = int(self.headers['Range'].split('=')[1].rstrip('-'))
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{len(PAYLOAD) - 1}/{len(PAYLOAD)}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(PAYLOAD) - start))
+        self.end_headers()
+
+        if server.truncate_at is not None and not start:
+            self.wfile.write(PAYLOAD[:server.truncate_at])
+            server.truncate_at = None
+            self.close_connection = True
+            return
+        self.wfile.write(PAYLOAD[start:])
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_fetcher(cache_dir, url, sha256):
+    return ArtifactFetcher(cache_dir, {
+        'rustdesk-windows': {'url': url, 'filename': 'rustdesk-windows.exe', 'sha256': sha256}
+    }, timeout=5)
+
+
+def test_pin_mismatch_is_rejected(stub, tmp_path):
+    fetcher = make_fetcher(tmp_path, stub.url, '0' * 64)
+
+    with pytest.raises(ArtifactFetchError, match='Checksum mismatch'):
+        fetcher.fetch('rustdesk-windows')
+
+    assert not (tmp_path / 'rustdesk-windows.exe').exists()
+    assert not (tmp_path / 'rustdesk-windows.exe.part').exists()
+
+
+def test_tampered_cache_is_refetched(stub, tmp_path):
+    (tmp_path / 'rustdesk-windows.exe').write_bytes(b'not the release')
+    fetcher = make_fetcher(tmp_path, stub.url, PAYLOAD_SHA256)
+
+    path = fetcher.fetch('rustdesk-windows')
+
+    assert path.read_bytes() == PAYLOAD
+    assert len(stub.requests) == 1
+
+
+def test_missing_pin_fails_closed(stub, tmp_path):
+    (tmp_path / 'rustdesk-windows.exe').write_bytes(PAYLOAD)
+    fetcher = make_fetcher(tmp_path, stub.url, '')
+
+    with pytest.raises(ArtifactFetchError, match='No sha256 pinned'):
+        fetcher.fetch('rustdesk-windows')
+    assert stub.requests == []
+
+
+def test_check_pins_names_unpinned_artifacts(stub, tmp_path):
+    make_fetcher(tmp_path, stub.url, PAYLOAD_SHA256).check_pins()
+
+    with pytest.raises(ArtifactFetchError, match=r'Pin artifacts\.rustdesk-windows\.sha256'):
+        make_fetcher(tmp_path, stub.url, '').check_pins()
+
+
+def test_concurrent_fetches_download_once(stub, tmp_path):
+    stub.delay = 0.3
+    fetcher = make_fetcher(tmp_path, stub.url, PAYLOAD_SHA256)
+    results = []
+
+    def fetch():
+        results.append(fetcher.fetch('rustdesk-windows'))
+
+    threads = [threading.Thread(target=fetch) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(stub.requests) == 1
+    assert len(results) == 8
+    assert all(path.read_bytes() == PAYLOAD for path in results)
+
+
+def test_interrupted_download_raises_and_resumes(stub, tmp_path):
+    stub.truncate_at = 100 * 1024
+    fetcher = make_fetcher(tmp_path, stub.url, PAYLOAD_SHA256)
+
+    with pytest.raises(ArtifactFetchError, match='Download of'):
+        fetcher.fetch('rustdesk-windows')
+
+    path = fetcher.fetch('rustdesk-windows')
+
+    assert path.read_bytes() == PAYLOAD
+    assert stub.requests == [None, f'bytes={100 * 1024}-']
@@ -0,0 +1,80 @@
+"""Graceful shutdown of the pre-fork API server (api/server.py)"""
+
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+import urllib.request
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('werkzeug')
+
+API_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api')
+
+# Runs admin_api.main() against a scratch database, with one worker
+DRIVER = '''
+import sys
+sys.path.insert(0, sys.argv[1])
+import admin_api
+admin_api.db.path = sys.argv[2]
+admin_api.warm_pool.size = 0
+admin_api.artifact_fetcher.artifacts['rustdesk-windows']['sha256'] = '0' * 64
+sys.argv = ['admin_api.py', '--host', '127.0.0.1', '--port', sys.argv[3],
+            '--workers', '1', '--threads', '4', '--graceful-timeout', '10']
+admin_api.main()
+'''
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_serving(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/api/stats', timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise AssertionError('server did not start')
+
+
+def test_heartbeat_posted_during_shutdown_is_persisted(tmp_path):
+    db_path = str(tmp_path / 'connectassist.db')
+    port = free_port()
+    server = subprocess.Popen([sys.executable, '-c', DRIVER, API_DIR, db_path, str(port)])
+    try:
+        wait_until_serving(port)
+
+        body = b'{"device_id": "shutdown-test", "customer_name": "Acme"}'
+        with socket.create_connection(('127.0.0.1', port)) as client:
+            # Headers now, body only after SIGTERM: the request is in flight
+            # while the worker shuts down
+            client.sendall(b'POST /api/devices/heartbeat HTTP/1.1\r\n'
+                           b'Host: 127.0.0.1\r\n'
+                           b'Content-Type: application/json\r\n'
+                           b'Content-Length: ' + str(len(body)).encode() + b'\r\n'
+                           b'Connection: close\r\n\r\n')
+            time.sleep(0.5)
+            server.send_signal(signal.SIGTERM)
+            time.sleep(1)
+            client.sendall(body)
+            response = client.makefile('rb').readline()
+        assert b' 200 ' in response
+
+        assert server.wait(timeout=30) == 0
+    finally:
+        if server.poll() is None:
+            server.kill()
+
+    with sqlite3.connect(db_path) as conn:
+        row = conn.execute("SELECT customer_name FROM devices WHERE id = 'shutdown-test'").fetchone()
+    assert row == ('Acme',)
@@ -5,7 +5,9 @@ class AdminDashboard {
         this.apiBase = '/api';
         this.currentDevices = [];
         this.currentSupportCode = null;
+        this.devicesWatermark = null;
         this.refreshInterval = null;
+        this.searchTimer = null;
         
         this.init();
     }
@@ -13,7 +15,39 @@ class AdminDashboard {
     init() {
         this.setupEventListeners();
         this.loadDashboardData();
-        this.startAutoRefresh();
+        this.connectEventStream();
+    }
+    
+    connectEventStream() {
+        // Push updates over Server-Sent Events; fall back to polling without them
+        if (!window.EventSource) {
+            this.startAutoRefresh();
+            return;
+        }
+        
+        this.eventSource = new EventSource(`${this.apiBase}/events`);
+        this.eventSource.onopen = () => this.stopAutoRefresh();
+        this.eventSource.onerror = () => {
+            this.startAutoRefresh();
+            // A 503 (too many open streams) closes the stream for good;
+            // reconnect later and poll until then
+            if (this.eventSource.readyState === EventSource.CLOSED) {
+                setTimeout(() => this.connectEventStream(), 60000);
+            }
+        };
+        
+        const on = (type, handler) => {
+            this.eventSource.addEventListener(type, (e) => handler(JSON.parse(e.data)));
+        };
+        
+        on('stats', (event) => this.renderStats(event.data));
+        on('device_heartbeat', (event) => this.mergeDevices([event.data]));
+        on('resync', () => this.loadDashboardData());
+        
+        ['code_created', 'codes_created', 'code_expired', 'codes_expired', 'package_ready', 'package_failed',
+         'session_started', 'session_ended'].forEach(type => {
+            on(type, (event) => this.addActivity(event));
+        });
     }
     
     setupEventListeners() {
@@ -58,21 +92,40 @@ class AdminDashboard {
             const response = await fetch(`${this.apiBase}/stats`);
             const stats = await response.json();
             
-            document.getElementById('onlineDevices').textContent = stats.online_devices || 0;
-            document.getElementById('totalCustomers').textContent = stats.total_customers || 0;
-            document.getElementById('activeCodes').textContent = stats.active_codes || 0;
-            document.getElementById('activeSessions').textContent = stats.active_sessions || 0;
+            this.renderStats(stats);
         } catch (error) {
             console.error('Error loading stats:', error);
         }
     }
     
+    renderStats(stats) {
+        document.getElementById('onlineDevices').textContent = stats.online_devices || 0;
+        document.getElementById('totalCustomers').textContent = stats.total_customers || 0;
+        document.getElementById('activeCodes').textContent = stats.active_codes || 0;
+        document.getElementById('activeSessions').textContent = stats.active_sessions || 0;
+    }
+    
     async loadDevices() {
         try {
-            const response = await fetch(`${this.apiBase}/devices`);
-            const devices = await response.json();
+            // Walk every keyset page for a full load
+            const devices = [];
+            let cursor = null;
+            let watermark = null;
+            do {
+                const params = new URLSearchParams({ limit: 500 });
+                if (cursor) params.set('cursor', cursor);
+                
+                const response = await fetch(`${this.apiBase}/devices?${params}`);
+                const page = await response.json();
+                if (page.error) throw new Error(page.error);
+                
+                devices.push(...page.devices);
+                cursor = page.next_cursor;
+                watermark = watermark || page.watermark;
+            } while (cursor);
             
             this.currentDevices = devices;
+            this.devicesWatermark = watermark;
             this.renderDevices(devices);
         } catch (error) {
             console.error('Error loading devices:', error);
@@ -80,6 +133,53 @@ class AdminDashboard {
         }
     }
     
+    async syncDevices() {
+        // Fetch only devices that changed since the last sync and merge them in
+        if (!this.devicesWatermark) {
+            return this.loadDevices();
+        }
+        
+        try {
+            const params = new URLSearchParams({ since: this.devicesWatermark, limit: 500 });
+            const response = await fetch(`${this.apiBase}/devices?${params}`);
+            const page = await response.json();
+            if (page.error) throw new Error(page.error);
+            
+            if (page.next_cursor) {
+                // Too many changes for one page; a full reload is cheaper
+                return this.loadDevices();
+            }
+            
+            this.devicesWatermark = page.watermark;
+            this.mergeDevices(page.devices);
+        } catch (error) {
+            console.error('Error syncing devices:', error);
+        }
+    }
+    
+    mergeDevices(changedDevices) {
+        if (!changedDevices || changedDevices.length === 0) return;
+        
+        const changed = new Map(changedDevices.map(device => [device.id, device]));
+        const devices = [];
+        this.currentDevices.forEach(device => {
+            if (changed.has(device.id)) {
+                // Pushed updates may carry only some fields; keep the rest
+                const update = Object.fromEntries(
+                    Object.entries(changed.get(device.id)).filter(([, value]) => value !== null && value !== undefined)
+                );
+                changed.set(device.id, { ...device, ...update });
+            } else {
+                devices.push(device);
+            }
+        });
+        devices.push(...changed.values());
+        devices.sort((a, b) => (b.last_seen || '').localeCompare(a.last_seen || '') || b.id.localeCompare(a.id));
+        
+        this.currentDevices = devices;
+        this.renderDevices(devices);
+    }
+    
     renderDevices(devices) {
         const grid = document.getElementById('devicesGrid');
         
@@ -149,10 +249,10 @@ class AdminDashboard {
     
     async loadRecentActivity() {
         try {
-            const response = await fetch(`${this.apiBase}/activity`);
-            const activities = await response.json();
+            const response = await fetch(`${this.apiBase}/activity?limit=10`);
+            const page = await response.json();
             
-            this.renderActivity(activities);
+            this.renderActivity(page.activities);
         } catch (error) {
             console.error('Error loading activity:', error);
         }
@@ -163,7 +263,7 @@ class AdminDashboard {
         
         if (!activities || activities.length === 0) {
             feed.innerHTML = `
-                <div class="activity-item">
+                <div class="activity-item activity-empty">
                     <div class="activity-icon">
                         <i class="fas fa-info-circle"></i>
                     </div>
@@ -179,7 +279,7 @@ class AdminDashboard {
         feed.innerHTML = activities.map(activity => `
             <div class="activity-item">
                 <div class="activity-icon">
-                    <i class="fas ${this.getActivityIcon(activity.type)}"></i>
+                    <i class="fas ${this.getActivityIcon(this.activityIconType(activity.type))}"></i>
                 </div>
                 <div class="activity-content">
                     <h5>${activity.title}</h5>
@@ -192,6 +292,43 @@ class AdminDashboard {
         `).join('');
     }
     
+    addActivity(event) {
+        // Prepend a pushed event to the activity feed
+        const data = event.data || {};
+        const who = data.customer_name || data.device_name || data.device_id || data.support_code || '';
+        const titles = {
+            'code_created': `Support code generated for ${who}`,
+            'codes_created': `${data.count} support codes generated`,
+            'code_expired': `Support code ${data.support_code} expired`,
+            'codes_expired': `${data.count} support codes expired`,
+            'package_ready': `Installer ready for code ${data.support_code}`,
+            'package_failed': `Installer build failed for code ${data.support_code}`,
+            'session_started': `Session started: ${who}`,
+            'session_ended': `Session ended: ${who}`
+        };
+        const feed = document.getElementById('activityFeed');
+        feed.querySelectorAll('.activity-empty').forEach(item => item.remove());
+        
+        feed.insertAdjacentHTML('afterbegin', `
+            <div class="activity-item">
+                <div class="activity-icon">
+                    <i class="fas ${this.getActivityIcon(this.activityIconType(event.type))}"></i>
+                </div>
+                <div class="activity-content">
+                    <h5>${titles[event.type] || event.type}</h5>
+                    <p>${data.error || data.connection_type || ''}</p>
+                </div>
+                <div class="activity-time">
+                    ${this.formatDate(event.timestamp)}
+                </div>
+            </div>
+        `);
+        
+        while (feed.children.length > 10) {
+            feed.lastElementChild.remove();
+        }
+    }
+    
     async generateSupportCode() {
         const form = document.getElementById('generateCodeForm');
         const formData = new FormData(form);
@@ -351,6 +488,19 @@ class AdminDashboard {
         return date.toLocaleDateString();
     }
     
+    activityIconType(eventType) {
+        // Map event types to the icon categories below
+        const activityTypes = {
+            'code_created': 'code_generated',
+            'codes_created': 'code_generated',
+            'codes_expired': 'code_expired',
+            'device_heartbeat': 'device_registered',
+            'package_failed': 'error'
+        };
+        
+        return activityTypes[eventType] || eventType;
+    }
+    
     getActivityIcon(type) {
         const icons = {
             'connection': 'fa-plug',
@@ -394,12 +544,34 @@ class AdminDashboard {
     }
     
     filterDevices(searchTerm) {
-        const cards = document.querySelectorAll('.device-card');
+        // Search on the server so matches do not depend on what is loaded
+        clearTimeout(this.searchTimer);
+        const term = searchTerm.trim();
         
-        cards.forEach(card => {
-            const text = card.textContent.toLowerCase();
-            const matches = text.includes(searchTerm.toLowerCase());
-            card.style.display = matches ? 'block' : 'none';
+        if (term.length < 2) {
+            this.showDeviceCards(() => true);
+            return;
+        }
+        
+        this.searchTimer = setTimeout(async () => {
+            try {
+                const params = new URLSearchParams({ q: term, kinds: 'device', limit: 100 });
+                const response = await fetch(`${this.apiBase}/search?${params}`);
+                const page = await response.json();
+                if (page.error) throw new Error(page.error);
+                
+                const matches = new Set(page.results.map(result => result.id));
+                this.showDeviceCards(card => matches.has(card.dataset.deviceId));
+            } catch (error) {
+                console.error('Error searching devices:', error);
+                this.showDeviceCards(card => card.textContent.toLowerCase().includes(term.toLowerCase()));
+            }
+        }, 200);
+    }
+    
+    showDeviceCards(matches) {
+        document.querySelectorAll('.device-card[data-device-id]').forEach(card => {
+            card.style.display = matches(card) ? 'block' : 'none';
         });
     }
     
@@ -418,12 +590,19 @@ class AdminDashboard {
     }
     
     startAutoRefresh() {
+        if (this.refreshInterval) return;
+        
         this.refreshInterval = setInterval(() => {
             this.loadStats();
-            this.loadDevices();
+            this.syncDevices();
         }, 30000); // Refresh every 30 seconds
     }
     
+    stopAutoRefresh() {
+        clearInterval(this.refreshInterval);
+        this.refreshInterval = null;
+    }
+    
     refreshDashboard() {
         this.loadDashboardData();
         this.showNotification('Dashboard refreshed', 'success');
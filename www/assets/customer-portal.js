@@ -218,16 +218,7 @@ async function updateConnectionStatus() {
         const response = await fetch('/api/status');
         const status = await response.json();
         
-        const statusElement = document.getElementById('connectionStatus');
-        if (statusElement) {
-            if (status.online) {
-                statusElement.innerHTML = '<i class="fas fa-check-circle"></i> ConnectAssist Online';
-                statusElement.className = 'status online';
-            } else {
-                statusElement.innerHTML = '<i class="fas fa-exclamation-circle"></i> ConnectAssist Offline';
-                statusElement.className = 'status offline';
-            }
-        }
+        setConnectionStatus(status.online);
     } catch (error) {
         console.error('Error checking status:', error);
         const statusElement = document.getElementById('connectionStatus');
@@ -238,6 +229,19 @@ async function updateConnectionStatus() {
     }
 }
 
+function setConnectionStatus(online) {
+    const statusElement = document.getElementById('connectionStatus');
+    if (statusElement) {
+        if (online) {
+            statusElement.innerHTML = '<i class="fas fa-check-circle"></i> ConnectAssist Online';
+            statusElement.className = 'status online';
+        } else {
+            statusElement.innerHTML = '<i class="fas fa-exclamation-circle"></i> ConnectAssist Offline';
+            statusElement.className = 'status offline';
+        }
+    }
+}
+
 function showMessage(message, type) {
     // Remove existing messages
     const existingMessages = document.querySelectorAll('.message');